@@ -1,4 +1,5 @@
 import os
+import asyncio
 
 from agno.models.ollama import Ollama
 from fastapi import FastAPI
@@ -14,12 +15,15 @@ from agno.knowledge.pdf import PDFKnowledgeBase
 from agno.document.reader.pdf_reader import PDFReader
 from agno.embedder.ollama import OllamaEmbedder
 from agno.vectordb.search import SearchType
-from agno.models.groq import Groq
 from agno.tools.duckduckgo import DuckDuckGoTools
 from agno.tools.gmail import GmailTools
 from agno.tools.yfinance import YFinanceTools
 from agent.team import Team
 from config.config import TOKEN_PATH, CREDENTIALS_PATH
+from config.config import RATE_LIMIT_DB_PATH, GROQ_REQUESTS_PER_MINUTE, GROQ_TOKENS_PER_MINUTE
+from models.agno_groq import RateLimitedGroq
+from models.rate_limiter import shared_rate_limiter
+from knowledge.semantic_cache import SemanticCache
 import uuid
 
 # Proxy settings
@@ -44,13 +48,40 @@ class TaskRequest(BaseModel):
 # Initialize shared components once
 def initialize_shared_components():
     embedder = OllamaEmbedder(id="nomic-embed-text", dimensions=768)
-    model =Groq(id='qwen-qwq-32b',timeout=60)
+    # 所有 uvicorn worker 通过同一个 SQLite 文件共享 Groq 的 RPM/TPM 配额
+    rate_limiter = shared_rate_limiter("groq", GROQ_REQUESTS_PER_MINUTE, GROQ_TOKENS_PER_MINUTE, RATE_LIMIT_DB_PATH)
+    model = RateLimitedGroq(id='qwen-qwq-32b', timeout=60, rate_limiter=rate_limiter)
 
     return model, embedder
 
 
 model, embedder = initialize_shared_components()
 
+# 语义缓存：复述形式不同的同一问题直接返回已有答案，不再运行整个 agent
+semantic_cache = SemanticCache(
+    embedder,
+    threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.92)),
+    ttl=float(os.getenv("SEMANTIC_CACHE_TTL", 3600)),
+)
+
+
+# 写入知识库的工具：调用后知识库内容变化，已缓存的答案可能过时
+KNOWLEDGE_UPDATE_TOOLS = {"add_to_knowledge", "update_knowledge"}
+
+
+def used_tools(response) -> set:
+    """一次运行中调用过的工具名（兼容 RunResponse.tools 为 dict 或对象的不同 agno 版本）"""
+    names = set()
+    for tool in getattr(response, "tools", None) or []:
+        name = tool.get("tool_name") if isinstance(tool, dict) else getattr(tool, "tool_name", None)
+        names.add(name or "unknown")
+    for message in getattr(response, "messages", None) or []:
+        for call in getattr(message, "tool_calls", None) or []:
+            function = call.get("function", {}) if isinstance(call, dict) else getattr(call, "function", None)
+            name = function.get("name") if isinstance(function, dict) else getattr(function, "name", None)
+            names.add(name or "unknown")
+    return names
+
 
 # Create a new team instance for each user session
 def create_team(session_id: str):
@@ -120,6 +151,16 @@ def create_team(session_id: str):
 # HTTP endpoint for task processing using run
 @app.post("/process_task")
 async def process_task(request: TaskRequest):
+    # embedding 是同步 HTTP 调用，放到线程池避免阻塞事件循环；缓存出错（如 Ollama 不可用）时照常运行 agent
+    try:
+        match = await asyncio.to_thread(semantic_cache.lookup, request.task)
+    except Exception as e:
+        print(f"⚠️ 语义缓存查询失败，跳过缓存: {e}")
+        match = None
+    if match is not None and match.hit:
+        print(f"semantic cache hit ({match.similarity:.3f}): {match.question}")
+        return {"response": match.answer, "cached": True, "similarity": match.similarity}
+
     session_id = str(uuid.uuid4())
     team = create_team(session_id)
 
@@ -133,9 +174,31 @@ async def process_task(request: TaskRequest):
 
     del session_storage[session_id]
     print(f"response: {result}")
+
+    # 调用过工具的运行（发邮件、读未读邮件、搜索最新信息等）有副作用或依赖实时数据，不缓存
+    tools_used = used_tools(response)
+    if tools_used & KNOWLEDGE_UPDATE_TOOLS:
+        semantic_cache.invalidate()
+    if not tools_used and match is not None:
+        try:
+            semantic_cache.add(request.task, result, embedding=match.embedding)
+        except Exception as e:
+            print(f"⚠️ 写入语义缓存失败: {e}")
     return {"response": result}
 
 
+# 知识库在本进程外加载或更新后调用，清空语义缓存
+@app.post("/semantic_cache/invalidate")
+async def invalidate_semantic_cache():
+    semantic_cache.invalidate()
+    return {"status": "success"}
+
+
+@app.get("/semantic_cache/stats")
+async def semantic_cache_stats():
+    return semantic_cache.stats()
+
+
 
 if __name__ == "__main__":
     import uvicorn
@@ -2,13 +2,20 @@ import os
 from groq import Groq
 #from groq_mock import Groq
 import json
-from ai_agent_omni import execute_ui
-from prompt_manager import get_agent_prompt
+from ai_agent_omni import execute_ui, execute_ui_plan
+from prompt_manager import get_agent_prompt, get_summary_prompt
 from tools.tools import tools, google_search, send_email, get_current_time
+from config.config import RATE_LIMIT_DB_PATH, GROQ_REQUESTS_PER_MINUTE, GROQ_TOKENS_PER_MINUTE, CONTEXT_TOKEN_BUDGET, CONTEXT_SUMMARIZE
+from models.rate_limiter import shared_rate_limiter, estimate_request_tokens, estimate_text_tokens
+from models.context_window import ConversationWindow
+from tools.parallel import run_tool_calls, parse_arguments, format_tool_output
 
 # Initialize Groq client (using your provided API key)
 client = Groq(api_key=os.getenv('GROQ_API_KEY'),timeout=60)
 
+# 与其他进程共享 Groq 的 RPM/TPM 配额
+rate_limiter = shared_rate_limiter("groq", GROQ_REQUESTS_PER_MINUTE, GROQ_TOKENS_PER_MINUTE, RATE_LIMIT_DB_PATH)
+
 # 生成格式化后的 JSON 工具列表
 tools_json = json.dumps(tools, indent=2, ensure_ascii=False)
 
@@ -16,14 +23,34 @@ available_functions = {
     'google_search': google_search,
     'send_email': send_email,
     'get_current_time': get_current_time,
-    'execute_ui': execute_ui
+    'execute_ui': execute_ui,
+    'execute_ui_plan': execute_ui_plan
 }
 
 
+def summarize_history(summary: str, transcript: str) -> str:
+    """用小模型把移出上下文窗口的旧对话并入运行摘要（在后台线程中调用）"""
+    prompt = get_summary_prompt(summary, transcript)
+    messages = [{'role': 'user', 'content': prompt}]
+    rate_limiter.acquire(estimate_request_tokens(messages))
+    response = client.chat.completions.create(model='llama-3.1-8b-instant', messages=messages, temperature=0.3)
+    return response.choices[0].message.content
+
+
+# 对话历史的 token 预算，工具定义每次都随请求发送，预先扣除
+context_window = ConversationWindow(
+    max_tokens=CONTEXT_TOKEN_BUDGET,
+    reserve_tokens=estimate_text_tokens(tools_json),
+    summarize_fn=summarize_history if CONTEXT_SUMMARIZE else None,
+)
+
+
 def query_groq(messages: list) -> str:
     """Call Groq API to get LLM response for the given conversation messages."""
     while True:
+        context_window.fit(messages)
         try:
+            rate_limiter.acquire(estimate_request_tokens(messages, tools=tools))
             response = client.chat.completions.create(
                 model='qwen-qwq-32b',  # 使用 Groq 支持的模型
                 messages=messages,
@@ -47,61 +74,51 @@ def query_groq(messages: list) -> str:
         # 获取模型返回的工具调用
         tool_calls = getattr(response_message, 'tool_calls', None)
 
-        output = ''
-
         if tool_calls:
-
-            # There may be multiple tool calls in the response
+            # 本轮的全部工具调用放在同一条 assistant 消息里
+            messages.append({
+                "role": "assistant",
+                "content": response_message.content,
+                "tool_calls": [
+                    {
+                        "id": tool.id,
+                        "function": {
+                            "name": tool.function.name,
+                            "arguments": tool.function.arguments
+                        },
+                        "type": "function"
+                    }
+                    for tool in tool_calls
+                ]
+            })
+
+            # 解析参数；找不到的函数或参数解析失败时直接把错误作为该调用的结果
+            calls, outputs = [], {}
             for tool in tool_calls:
-                # Ensure the function is available, and then call it
-                if function_to_call := available_functions.get(tool.function.name):
-                    print('🔹Calling function:', tool.function.name)
-                    # 解析 JSON 结构，确保 `arguments` 是标准字典格式
-                    try:
-                        # 确保 arguments 是标准 Python 字典
-                        raw_arguments = tool.function.arguments  # 直接从 tool 读取参数
-
-                        if isinstance(raw_arguments, str):
-                            print(f"❌ raw_arguments str")
-                            arguments = json.loads(raw_arguments)  # 确保是 dict
-                        elif isinstance(raw_arguments, dict):
-                            print(f"✅ raw_arguments: dict")
-                            arguments = raw_arguments  # 如果已经是 dict，直接使用
-                        else:
-                            arguments = {}  # 兜底防止 NoneType
-                    except json.JSONDecodeError as e:
-                        print(f"❌ JSON 解析失败: {e}")
-                        continue  # 跳过当前工具调用
-
-                    print('📥Arguments:', arguments)
-                    # 处理无参数函数
-                    if arguments:
-                        output = function_to_call(**arguments)
-
-
-                    print('✅Function output:', output)
-
-                    # Add the LLM's response to the conversation
-                    messages.append({
-                        "role": "assistant",
-                        "content": response_message.content,
-                        "tool_calls": [
-                            {
-                                "id": tool.id,
-                                "function": {
-                                    "name": tool.function.name,
-                                    "arguments": tool.function.arguments
-                                },
-                                "type": "function"
-                            }
-                        ]
-                    })
-                    # Add the tool response to the conversation
-                    messages.append({'tool_call_id': tool.id, 'role': "tool", 'name': tool.function.name,
-                                     'content': json.dumps(output) if isinstance(output, (dict, list)) else str(output)})
-
-                else:
+                function_to_call = available_functions.get(tool.function.name)
+                if not function_to_call:
                     print('❌Function', tool.function.name, 'not found')
+                    outputs[tool.id] = f"Function {tool.function.name} not found"
+                    continue
+                try:
+                    arguments = parse_arguments(tool.function.arguments)
+                except json.JSONDecodeError as e:
+                    print(f"❌ JSON 解析失败: {e}")
+                    outputs[tool.id] = f"参数解析失败: {e}"
+                    continue
+                print('🔹Calling function:', tool.function.name)
+                print('📥Arguments:', arguments)
+                calls.append((tool.id, function_to_call, arguments))
+
+            # There may be multiple tool calls in the response: 并发执行，互不等待
+            for (tool_id, _, _), output in zip(calls, run_tool_calls(calls)):
+                print('✅Function output:', output)
+                outputs[tool_id] = output
+
+            # 按 tool_call 的原始顺序添加工具结果
+            for tool in tool_calls:
+                messages.append({'tool_call_id': tool.id, 'role': "tool", 'name': tool.function.name,
+                                 'content': format_tool_output(outputs[tool.id])})
 
         # Only needed to chat with the model using the tool call results
         if not tool_calls:
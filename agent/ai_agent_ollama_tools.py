@@ -1,8 +1,15 @@
-import ollama
 import json
-from ai_agent_omni import execute_ui
-from prompt_manager import get_agent_prompt
+from ai_agent_omni import execute_ui, execute_ui_plan
+from prompt_manager import get_agent_prompt, get_summary_prompt
 from tools.tools import tools, google_search, send_email, get_current_time
+from models.ollama_client import get_ollama_client
+from tools.parallel import run_tool_calls, parse_arguments, format_tool_output
+from config.config import CONTEXT_TOKEN_BUDGET, CONTEXT_SUMMARIZE
+from models.rate_limiter import estimate_text_tokens
+from models.context_window import ConversationWindow
+
+# 共享的 Ollama 客户端（连接池 + keep_alive 常驻）
+ollama_client = get_ollama_client()
 
 # 生成格式化后的 JSON 工具列表
 tools_json = json.dumps(tools, indent=2, ensure_ascii=False)
@@ -11,14 +18,34 @@ available_functions = {
   'google_search': google_search,
   'send_email': send_email,
   'get_current_time': get_current_time,
-  'execute_ui':execute_ui
+  'execute_ui':execute_ui,
+  'execute_ui_plan':execute_ui_plan
 }
 
 
+def summarize_history(summary: str, transcript: str) -> str:
+    """把移出上下文窗口的旧对话并入运行摘要（在后台线程中调用）"""
+    response = ollama_client.chat(
+        model='qwen2.5:14b',
+        messages=[{'role': 'user', 'content': get_summary_prompt(summary, transcript)}],
+        options={'temperature': 0.3},
+    )
+    return response.message.content
+
+
+# 对话历史的 token 预算，工具定义每次都随请求发送，预先扣除
+context_window = ConversationWindow(
+    max_tokens=CONTEXT_TOKEN_BUDGET,
+    reserve_tokens=estimate_text_tokens(tools_json),
+    summarize_fn=summarize_history if CONTEXT_SUMMARIZE else None,
+)
+
+
 def query_llm(messages: list) -> str:
     """调用 Ollama 本地API获取 LLM 对指定对话消息的回复。"""
     while True:
-        response =ollama.chat(
+        context_window.fit(messages)
+        response = ollama_client.chat(
             model='qwen2.5:14b',
             messages=messages,
             options={'temperature':0.6},
@@ -27,24 +54,25 @@ def query_llm(messages: list) -> str:
 
         tool_calls = response.message.tool_calls  # 获取模型返回的工具调用
 
-        output = ''
-
         if tool_calls:
-            # There may be multiple tool calls in the response
+            messages.append(response.message)
+
+            # There may be multiple tool calls in the response: 并发执行，互不等待
+            calls = []
             for tool in tool_calls:
                 # Ensure the function is available, and then call it
                 if function_to_call := available_functions.get(tool.function.name):
                     print('🔹Calling function:', tool.function.name)
                     print('📥Arguments:', tool.function.arguments)
-                    output = function_to_call(**tool.function.arguments)
-                    print('✅Function output:', output)
-
-                    messages.append(response.message)
-                    messages.append({'role': 'tool', 'content': str(output), 'name': tool.function.name})
-
+                    calls.append((tool.function.name, function_to_call, parse_arguments(tool.function.arguments)))
                 else:
                     print('❌Function', tool.function.name, 'not found')
 
+            # 按模型给出的顺序添加工具结果
+            for (name, _, _), output in zip(calls, run_tool_calls(calls)):
+                print('✅Function output:', output)
+                messages.append({'role': 'tool', 'content': format_tool_output(output), 'name': name})
+
         # Only needed to chat with the model using the tool call results
         if not response.message.tool_calls:
             print('No tool calls returned from model')
@@ -75,6 +103,10 @@ def agent_respond(messages: list):
 if __name__ == "__main__":
     print("🤖 欢迎使用 T-AIAgent 智能助手！输入 'exit' 退出对话。")
 
+    # 预热模型并保持常驻，避免首轮对话等待模型加载
+    ollama_client.warm_up()
+    ollama_client.start_heartbeat()
+
     prompt = get_agent_prompt()
 
     # 维护整个对话历史
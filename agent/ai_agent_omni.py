@@ -1,24 +1,53 @@
-import time
+import sys
+import threading
+from functools import lru_cache, partial
 from PIL import Image
 import pyautogui
 import tkinter as tk
-import threading
-from omniparser_function import click_bbox, process_image
-from models.query_llm import query_deepseek
+from omniparser_function import (
+    OmniParserClient, click_bbox, encode_image, wait_for_region_change, wait_for_stable,
+    CLICK_REFUSED, CLICK_NO_CHANGE,
+)
+from omniparser_cache import OmniParserCache
+from omniparser_incremental import IncrementalParser
+from config.config import OMNIPARSER_CACHE_DB_PATH, UI_EXECUTION_PROFILE
+from models.query_llm import query_target, query_deepseek_plan
+from ui_grounding import match_target
+from ui_spatial import SpatialIndex
+from tools.parallel import serial_tool
+
+
+# 屏幕没有变化时复用上一次的 OmniParser 解析结果
+omniparser_cache = OmniParserCache(db_path=OMNIPARSER_CACHE_DB_PATH)
+
+# OmniParser 解析参数
+PARSE_PARAMS = dict(box_threshold=0.05, iou_threshold=0.1, use_paddleocr=True, imgsz=640)
+
+# 复用连接池的 OmniParser 客户端；这里只用 parsed_content，不解码标注图
+omniparser_client = OmniParserClient(want_labeled_image=False, cache=omniparser_cache)
+
+# 连续操作时只重新解析屏幕上变化的区域
+incremental_parser = IncrementalParser(partial(omniparser_client.process_image, **PARSE_PARAMS))
 
 
-def get_dpi():
-    """获取系统 DPI"""
-    root = tk.Tk()
+@lru_cache(maxsize=None)
+def _query_dpi(display):
+    """通过 Tk 读取指定显示器的 DPI（每个显示器只查询一次）"""
+    root = tk.Tk(screenName=display)
     dpi = root.winfo_fpixels('1i')
     root.destroy()
     print(f"系统 DPI: {dpi}")
     return dpi
 
 
-def capture_screen(image_path):
-    """截取当前屏幕并保存为图像文件"""
-    dpi = get_dpi()
+def get_dpi(display=None):
+    """获取系统 DPI，结果按显示器缓存"""
+    return _query_dpi(display)
+
+
+def capture_frame(display=None):
+    """截取当前屏幕，按 DPI 缩放后返回 PIL 图像"""
+    dpi = get_dpi(display)
     screenshot = pyautogui.screenshot()
 
     if dpi != 96:
@@ -26,52 +55,183 @@ def capture_screen(image_path):
         new_width = int(screenshot.width * scale_factor)
         new_height = int(screenshot.height * scale_factor)
         screenshot = screenshot.resize((new_width, new_height), Image.Resampling.LANCZOS)
-        # 保存截图
-        threading.Thread(target=save_screenshot, args=(screenshot, image_path)).start()
+    return screenshot
 
 
-def save_screenshot(screenshot, image_path):
-    screenshot.save(image_path)
-    print(f"屏幕截图已保存至: {image_path}")
+def capture_screen(image_path=None, image_format='PNG', display=None):
+    """截取当前屏幕并编码为内存中的图像字节串；传入 `image_path` 时另存一份到磁盘"""
+    image_bytes = encode_image(capture_frame(display), image_format)
+    if image_path:
+        # 字节串不可变，后台写盘不会和上传产生竞争
+        threading.Thread(target=save_screenshot, args=(image_bytes, image_path)).start()
+    return image_bytes
 
 
-def execute_ui(user_input: str, image_path: str = "D:\\WallPaper\\test.png"):
-    # 1. 截屏
-    #capture_screen(image_path)
+def save_screenshot(image_bytes, image_path):
+    with open(image_path, 'wb') as f:
+        f.write(image_bytes)
+    print(f"屏幕截图已保存至: {image_path}")
+
 
-    # 2. 调用 omniparser 处理截图
+def parse_screen(image_path: str = None, image_format: str = 'PNG', incremental: bool = True):
+    """截屏并调用 omniparser 解析：未指定图片时直接在内存中截取当前屏幕"""
     print("等待 omniparser 解析...")
-    time.sleep(5)
-    parsed_result = process_image(
-        image_path=image_path,
-        box_threshold=0.05,
-        iou_threshold=0.1,
-        use_paddleocr=True,
-        imgsz=640
+    if image_path:
+        return omniparser_client.process_image(image_path=image_path, **PARSE_PARAMS)
+    if incremental:
+        # 与上一帧比较，只解析变化的区域
+        return incremental_parser.parse(capture_frame())
+    return omniparser_client.process_image(
+        image_bytes=capture_screen(image_format=image_format),
+        image_format=image_format,
+        **PARSE_PARAMS
     )
 
+
+@serial_tool
+def execute_ui(
+        user_input: str,
+        image_path: str = None,
+        image_format: str = 'PNG',
+        incremental: bool = True,
+        profile: str = UI_EXECUTION_PROFILE
+):
+    # 1. 截屏并调用 omniparser 处理截图
+    parsed_result = parse_screen(image_path, image_format, incremental)
+
     print(f"omniparser result:", parsed_result)
 
     if parsed_result['status'] != 'success':
         print("Omniparser 解析失败:", parsed_result['message'])
         return 'Failed to execute the operation.'
 
-    # 3. 结合用户输入，调用 deepseek-r1 推理
-    print("调用 deepseek-r1 获取目标信息...")
+    # 2. 先尝试本地确定性匹配（含“X 下面的图标”这类空间关系），目标不明确时再调用 deepseek-r1 推理
     print(user_input)
-    target_data = query_deepseek(user_input, parsed_result['parsed_content'])
+    spatial_index = SpatialIndex.from_parsed(parsed_result['parsed_content'])
+    target_data = match_target(user_input, parsed_result['parsed_content'])
+    if target_data:
+        path = 'local'
+        print(f"本地匹配命中 (score={target_data['score']})，跳过 LLM")
+    else:
+        path = 'llm'
+        print("本地匹配不明确，调用 LLM 获取目标信息...")
+        target_data = query_target(user_input, parsed_result['parsed_content'])
 
     if target_data:
-        print("AI 推理目标:", target_data)
+        print(f"目标 ({path}):", target_data)
         # 提取 bbox 字段
         bbox = target_data['bbox']
-        click_bbox(bbox)
-        return 'Success to execute the operation'
+        # 没有识别出动作时保持原来的默认动作（双击）
+        action = target_data.get('action') or 'double_click'
+        status = click_bbox(bbox, profile=profile, action=action, spatial_index=spatial_index)
+        if status == CLICK_REFUSED:
+            return 'Failed to execute the operation: another element lies under the click point.'
+        if status == CLICK_NO_CHANGE:
+            return f'Clicked the target, but the screen did not change (grounding: {path})'
+        return f'Success to execute the operation (grounding: {path})'
     else:
         print("未能解析到有效的目标数据")
         return 'Failed to execute the operation due to the target was not found.'
 
 
+def type_text(text: str):
+    """输入文字；非 ASCII 文字（如中文）pyautogui 无法直接键入，改为经剪贴板粘贴"""
+    if text.isascii():
+        pyautogui.write(text, interval=0.01)
+    else:
+        import pyperclip
+        pyperclip.copy(text)
+        pyautogui.hotkey('command' if sys.platform == 'darwin' else 'ctrl', 'v')
+
+
+def ground_step(step: dict, parsed_content):
+    """为计划中没有 bbox 的点击步骤在最新的解析结果中定位目标：先本地匹配，不明确时再问 LLM"""
+    target = step.get('target') or ''
+    target_data = match_target(target, parsed_content)
+    if target_data:
+        return target_data, 'local'
+    verb = '点击' if step['action'] == 'click' else '双击'
+    return query_target(f"{verb}{target}", parsed_content), 'llm'
+
+
+@serial_tool
+def execute_ui_plan(
+        user_input: str,
+        image_path: str = None,
+        image_format: str = 'PNG',
+        incremental: bool = True,
+        profile: str = UI_EXECUTION_PROFILE,
+        change_timeout: float = 10.0
+):
+    """执行复合指令（如“打开浏览器然后点击地址栏”）：解析一次屏幕、一次 LLM 调用生成动作列表后依次执行
+
+    只有声明了 `refresh` 或缺少 bbox 的点击步骤才会重新解析屏幕。
+    """
+    parsed_result = parse_screen(image_path, image_format, incremental)
+    if parsed_result['status'] != 'success':
+        print("Omniparser 解析失败:", parsed_result['message'])
+        return 'Failed to execute the operation.'
+    parses, llm_calls = 1, 1
+
+    print("调用 deepseek-r1 生成操作计划...")
+    steps = query_deepseek_plan(user_input, parsed_result['parsed_content'])
+    if not steps:
+        print("未能生成有效的操作计划")
+        return 'Failed to execute the operation due to no valid plan.'
+    print(f"操作计划（{len(steps)} 步）:", steps)
+
+    grab_screen = lambda: pyautogui.screenshot().reduce(4)
+    stale = False  # 上一次解析之后界面是否可能已经变化
+    reference = None  # 下一步是 wait_for_change 时，在本步动作之前截取的参考画面
+    for index, step in enumerate(steps, 1):
+        action = step.get('action')
+        print(f"步骤 {index}/{len(steps)}: {step}")
+        baseline, reference = reference, None
+        if action != 'wait_for_change' and index < len(steps) and steps[index].get('action') == 'wait_for_change':
+            # 动作触发的变化可能在等待步骤开始前就已完成，因此在动作之前截取参考画面
+            reference = grab_screen()
+
+        if action in ('click', 'double_click'):
+            bbox = step.get('bbox')
+            if step.get('refresh') or not bbox:
+                if stale:
+                    # 界面已变化，重新截屏解析（增量模式下只解析变化区域）
+                    parsed_result = parse_screen(None, image_format, incremental)
+                    parses += 1
+                    stale = False
+                    if parsed_result['status'] != 'success':
+                        return f'Failed at step {index}: omniparser error.'
+                target_data, path = ground_step(step, parsed_result['parsed_content'])
+                llm_calls += path == 'llm'
+                if not target_data:
+                    return f'Failed at step {index}: target "{step.get("target")}" was not found.'
+                bbox = target_data['bbox']
+            # 界面没变时，点击前核对点击位置下的元素
+            spatial_index = None if stale else SpatialIndex.from_parsed(parsed_result['parsed_content'])
+            status = click_bbox(bbox, profile=profile, action=action, spatial_index=spatial_index)
+            if status == CLICK_REFUSED:
+                return f'Failed at step {index}: another element lies under the click point.'
+            if status == CLICK_NO_CHANGE:
+                print(f"步骤 {index} 点击后目标区域没有变化，继续执行")
+            stale = True
+        elif action == 'type':
+            type_text(str(step.get('text', '')))
+            stale = True
+        elif action == 'hotkey':
+            pyautogui.hotkey(*step.get('keys', []))
+            stale = True
+        elif action == 'wait_for_change':
+            if baseline is None:
+                baseline = grab_screen()
+            timeout = float(step.get('timeout', change_timeout))
+            if wait_for_region_change(grab_screen, baseline, timeout):
+                wait_for_stable(grab_screen, timeout)
+        else:
+            print(f"未知的动作类型: {action}，跳过")
+
+    return f'Success to execute the operation ({len(steps)} steps, {parses} parses, {llm_calls} LLM calls)'
+
+
 if __name__ == "__main__":
     user_input = input("请输入操作指令（例如，点击回收站图标）：")
     result = execute_ui(user_input)
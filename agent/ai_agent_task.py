@@ -5,7 +5,6 @@ import time
 from agno.agent import Agent, RunResponse
 from agno.document.reader.pdf_reader import PDFReader
 from agno.embedder.ollama import OllamaEmbedder
-from agno.models.groq import Groq
 from agno.storage.agent.sqlite import SqliteAgentStorage
 from agno.tools.duckduckgo import DuckDuckGoTools
 from agno.tools.yfinance import YFinanceTools
@@ -24,6 +23,10 @@ from agno.vectordb.search import SearchType
 from config.config import TOKEN_PATH, DOWNLOAD_DIR
 from config.config import CREDENTIALS_PATH
 from config.config import DB_PATH
+from config.config import RATE_LIMIT_DB_PATH, GROQ_REQUESTS_PER_MINUTE, GROQ_TOKENS_PER_MINUTE
+from models.agno_groq import RateLimitedGroq
+from models.rate_limiter import shared_rate_limiter
+from models.retry import backoff_delay
 
 # Proxy Server（Clash/V2Ray/Trojan port）
 os.environ["HTTP_PROXY"] = "http://127.0.0.1:7890"
@@ -48,8 +51,9 @@ storage = SqliteAgentStorage(
     # db_file: Sqlite database file
     db_file=DB_PATH,
 )
-# Create Groq model
-model=Groq(id='qwen-qwq-32b',timeout=60)
+# Create Groq model (rate limited, quota shared with other processes)
+rate_limiter = shared_rate_limiter("groq", GROQ_REQUESTS_PER_MINUTE, GROQ_TOKENS_PER_MINUTE, RATE_LIMIT_DB_PATH)
+model=RateLimitedGroq(id='qwen-qwq-32b',timeout=60,rate_limiter=rate_limiter)
 
 # Create Ollama embedder
 embedder = OllamaEmbedder(id="nomic-embed-text", dimensions=768)
@@ -235,8 +239,8 @@ class TaskExecutor:
                             print(f"❌ 步骤 {step_index} 执行失败 {self.max_retries} 次，跳过该步骤")
                             break  # 超过最大重试次数，跳过当前步骤
 
-                    # 适当延迟，防止 API 速率限制
-                    time.sleep(20)
+                    # 指数退避（full jitter）后重试，代替固定等待 20 秒
+                    time.sleep(backoff_delay(retry_count, base_delay=2.0, max_delay=20.0))
 
         except Exception as e:
             print(f"❌ 任务执行失败: {str(e)}")
@@ -3,7 +3,6 @@ import json
 import re
 import time
 from agno.agent import Agent, RunResponse
-from agno.models.groq import Groq
 from agno.storage.postgres import PostgresStorage
 from agno.tools.duckduckgo import DuckDuckGoTools
 from agno.tools.yfinance import YFinanceTools
@@ -12,6 +11,10 @@ from agno.tools.website import WebsiteTools
 from agno.tools.gmail import GmailTools
 from config.config import TOKEN_PATH
 from config.config import CREDENTIALS_PATH
+from config.config import RATE_LIMIT_DB_PATH, GROQ_REQUESTS_PER_MINUTE, GROQ_TOKENS_PER_MINUTE
+from models.agno_groq import RateLimitedGroq
+from models.rate_limiter import shared_rate_limiter
+from models.retry import backoff_delay
 
 # 代理服务器（Clash/V2Ray/Trojan 端口）
 os.environ["HTTP_PROXY"] = "http://127.0.0.1:7890"
@@ -44,8 +47,9 @@ gmail_tools=GmailTools(
         search_emails=True
     )
 
-# Create Groq model
-model=Groq(id='qwen-qwq-32b',timeout=60)
+# Create Groq model (rate limited, quota shared with other processes)
+rate_limiter = shared_rate_limiter("groq", GROQ_REQUESTS_PER_MINUTE, GROQ_TOKENS_PER_MINUTE, RATE_LIMIT_DB_PATH)
+model=RateLimitedGroq(id='qwen-qwq-32b',timeout=60,rate_limiter=rate_limiter)
 
 # Create reasoning agent
 reason_agent = Agent(
@@ -186,8 +190,8 @@ class TaskExecutor:
                             print(f"❌ 步骤 {step_index} 执行失败 {self.max_retries} 次，跳过该步骤")
                             break  # 超过最大重试次数，跳过当前步骤
 
-                    # 适当延迟，防止 API 速率限制
-                    time.sleep(20)
+                    # 指数退避（full jitter）后重试，代替固定等待 20 秒
+                    time.sleep(backoff_delay(retry_count, base_delay=2.0, max_delay=20.0))
 
         except Exception as e:
             print(f"❌ 任务执行失败: {str(e)}")
@@ -0,0 +1,48 @@
+"""OmniParser 输出解析的微基准：比较逐行 ast.literal_eval 与正则解析 + 列式元素表、逐个与批量坐标转换
+
+运行：python -m benchmarks.bench_element_parse
+"""
+import ast
+import timeit
+
+from ui_elements import ElementTable, bboxes_to_coords, parse_elements
+
+
+def make_content(num_elements: int = 300) -> str:
+    lines = []
+    for i in range(num_elements):
+        element = {
+            "type": "icon" if i % 3 else "text",
+            "bbox": [i / 1000, 0.1 + i / 5000, i / 1000 + 0.02, 0.12 + i / 5000],
+            "interactivity": bool(i % 2),
+            "content": f"Element label {i} 图标",
+        }
+        lines.append(f"icon {i}: {element}")
+    return "\n".join(lines)
+
+
+def literal_eval_parse(content: str) -> list:
+    return [ast.literal_eval(line[line.index("{"):line.rindex("}") + 1]) for line in content.split("\n")]
+
+
+def bench(number: int = 200) -> None:
+    content = make_content()
+    table = ElementTable.from_parsed(content)
+    assert parse_elements(content) == literal_eval_parse(content)
+
+    cases = {
+        "ast.literal_eval 逐行": lambda: literal_eval_parse(content),
+        "正则解析": lambda: parse_elements(content),
+        "正则解析 + 元素表": lambda: ElementTable.from_parsed(content),
+        "逐个坐标转换": lambda: [bboxes_to_coords([bbox], 1920, 1080) for bbox in table.bboxes],
+        "批量坐标转换": lambda: table.screen_coords(1920, 1080),
+    }
+
+    print(f"元素数: {len(table)}")
+    for name, fn in cases.items():
+        seconds = min(timeit.repeat(fn, number=number, repeat=3))
+        print(f"{name:<20} {seconds / number * 1e3:8.3f} ms/次")
+
+
+if __name__ == "__main__":
+    bench()
@@ -0,0 +1,113 @@
+"""groq_mock 响应对象的微基准：比较解析一条响应（含大量 tool_calls）在不同访问模式下的单次开销
+
+同时给出改为按需解析之前、构造时就复制全部字段的实现（`Eager*`）作为对照。
+
+运行：python -m benchmarks.bench_groq_response
+"""
+import json
+import timeit
+
+from models.groq_mock import ChatCompletionResponse, json_loads
+
+
+class EagerToolFunction:
+    def __init__(self, function: dict):
+        self.name = function.get("name", "")
+        self.arguments = function.get("arguments", "{}")
+
+
+class EagerToolCall:
+    def __init__(self, tool_call: dict):
+        self.id = tool_call.get("id", "")
+        self.type = tool_call.get("type", "function")
+        self.function = EagerToolFunction(tool_call.get("function", {}))
+
+
+class EagerChatMessage:
+    def __init__(self, message: dict):
+        self.role = message.get("role", "assistant")
+        self.content = message.get("content", "")
+        self.tool_calls = [EagerToolCall(tc) for tc in message.get("tool_calls", [])]
+
+
+class EagerChatChoice:
+    def __init__(self, choice: dict):
+        self.index = choice.get("index", 0)
+        self.message = EagerChatMessage(choice.get("message", {}))
+        self.logprobs = choice.get("logprobs", None)
+        self.finish_reason = choice.get("finish_reason", "stop")
+
+
+class EagerChatCompletionResponse:
+    """改为按需解析之前的实现：构造时复制全部字段"""
+
+    def __init__(self, data: dict):
+        self.id = data.get("id")
+        self.object = data.get("object")
+        self.created = data.get("created")
+        self.model = data.get("model")
+        self.choices = [EagerChatChoice(choice) for choice in data.get("choices", [])]
+        self.usage = data.get("usage", {})
+        self.system_fingerprint = data.get("system_fingerprint", "")
+        self.x_groq = data.get("x_groq", {})
+
+
+def make_payload(num_tool_calls: int = 8, content_size: int = 4000) -> bytes:
+    data = {
+        "id": "chatcmpl-bench",
+        "object": "chat.completion",
+        "created": 1700000000,
+        "model": "qwen-qwq-32b",
+        "choices": [{
+            "index": 0,
+            "message": {
+                "role": "assistant",
+                "content": "思考" * (content_size // 2),
+                "tool_calls": [
+                    {
+                        "id": f"call_{i}",
+                        "type": "function",
+                        "function": {"name": "google_search", "arguments": json.dumps({"query": f"q{i}"})},
+                    }
+                    for i in range(num_tool_calls)
+                ],
+            },
+            "logprobs": None,
+            "finish_reason": "tool_calls",
+        }],
+        "usage": {"prompt_tokens": 1200, "completion_tokens": 300, "total_tokens": 1500},
+        "system_fingerprint": "fp_bench",
+        "x_groq": {"id": "req_bench"},
+    }
+    return json.dumps(data, ensure_ascii=False).encode()
+
+
+def bench(number: int = 20000) -> None:
+    raw = make_payload()
+    decoded = json_loads(raw)
+
+    def tool_loop(response_class):
+        # agent 工具循环的访问模式：遍历 tool_calls，读取函数名和参数
+        message = response_class(decoded).choices[0].message
+        return [(tc.id, tc.function.name, tc.function.arguments) for tc in message.tool_calls]
+
+    cases = {
+        "json 解码": lambda: json_loads(raw),
+        "构造响应对象": lambda: ChatCompletionResponse(decoded),
+        "构造响应对象 (eager)": lambda: EagerChatCompletionResponse(decoded),
+        "构造 + 读取 content": lambda: ChatCompletionResponse(decoded).choices[0].message.content,
+        "构造 + 读取 content (eager)": lambda: EagerChatCompletionResponse(decoded).choices[0].message.content,
+        "工具循环": lambda: tool_loop(ChatCompletionResponse),
+        "工具循环 (eager)": lambda: tool_loop(EagerChatCompletionResponse),
+        "解码 + 构造 + 读取 content": lambda: ChatCompletionResponse(json_loads(raw)).choices[0].message.content,
+        "解码 + 构造 + 读取 content (eager)": lambda: EagerChatCompletionResponse(json_loads(raw)).choices[0].message.content,
+    }
+
+    print(f"JSON 解码器: {json_loads.__module__}.{json_loads.__name__}，响应大小: {len(raw)} bytes")
+    for name, fn in cases.items():
+        seconds = min(timeit.repeat(fn, number=number, repeat=3))
+        print(f"{name:<32} {seconds / number * 1e6:8.2f} µs/次")
+
+
+if __name__ == "__main__":
+    bench()
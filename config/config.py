@@ -18,3 +18,32 @@ DB_TEAM_PATH = os.path.join(CONFIG_DIR, "agent_team_sessions.db")
 DOWNLOAD_DIR = Path(__file__).parent.parent / "tmp"
 
 
+
+# Groq 客户端限流（SQLite 文件让同一台机器上的多个进程共享配额）
+RATE_LIMIT_DB_PATH = os.path.join(CONFIG_DIR, "rate_limit.db")
+GROQ_REQUESTS_PER_MINUTE = int(os.getenv("GROQ_REQUESTS_PER_MINUTE", 30))
+GROQ_TOKENS_PER_MINUTE = int(os.getenv("GROQ_TOKENS_PER_MINUTE", 6000))
+
+# OmniParser 解析结果缓存（按截图感知哈希）
+OMNIPARSER_CACHE_DB_PATH = os.path.join(CONFIG_DIR, "omniparser_cache.db")
+
+# UI 操作执行配置：fast 按画面变化等待，demo 保留固定等待和鼠标动画便于演示
+UI_EXECUTION_PROFILE = os.getenv("UI_EXECUTION_PROFILE", "fast")
+
+# UI 自动化调试输出（坐标转换详情等）
+UI_DEBUG = os.getenv("UI_DEBUG", "0") == "1"
+
+# Ollama 本地模型：keep_alive 固定常驻时长，启动时预热的模型和心跳间隔
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_WARM_MODELS = [m.strip() for m in os.getenv("OLLAMA_WARM_MODELS", "qwen2.5:14b,deepseek-r1:14b").split(",") if m.strip()]
+OLLAMA_HEARTBEAT_SECONDS = float(os.getenv("OLLAMA_HEARTBEAT_SECONDS", 240))
+
+# UI 目标识别的 LLM provider（按顺序作为冷启动时的优先级），以及是否对慢请求发对冲请求
+GROUNDING_PROVIDERS = [p.strip() for p in os.getenv("GROUNDING_PROVIDERS", "deepseek,ollama,groq").split(",") if p.strip()]
+GROUNDING_HEDGE = os.getenv("GROUNDING_HEDGE", "1") == "1"
+GROQ_GROUNDING_MODEL = os.getenv("GROQ_GROUNDING_MODEL", "deepseek-r1-distill-llama-70b")
+
+# CLI 工具 agent 的上下文窗口：每次调用模型时提示词的 token 预算，超出的旧对话是否在后台并入摘要
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 4000))
+CONTEXT_SUMMARIZE = os.getenv("CONTEXT_SUMMARIZE", "1") == "1"
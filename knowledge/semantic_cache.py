@@ -0,0 +1,144 @@
+import time
+import threading
+from typing import Any, List, Union
+
+import numpy as np
+
+
+class SemanticMatch:
+    """一次语义缓存查询的结果"""
+
+    __slots__ = ("answer", "similarity", "embedding", "question")
+
+    def __init__(self, answer: Union[str, None], similarity: float, embedding: np.ndarray, question: Union[str, None] = None):
+        self.answer = answer
+        self.similarity = similarity
+        self.embedding = embedding
+        self.question = question
+
+    @property
+    def hit(self) -> bool:
+        return self.answer is not None
+
+
+class SemanticCache:
+    """基于向量相似度的问答缓存，复述形式不同的同一问题可以直接复用已有答案
+
+    向量由传入的 embedder（如 agno 的 `OllamaEmbedder`）生成，归一化后存放在进程内的矩阵中，
+    查询时做一次矩阵乘法求余弦相似度。每条记录有独立的过期时间，知识库变化时调用 `invalidate()`。
+    只应缓存没有副作用、不依赖实时数据的答案（如未调用任何工具的运行）。
+    """
+
+    def __init__(
+        self,
+        embedder: Any,
+        threshold: float = 0.92,
+        ttl: Union[float, None] = 3600.0,
+        max_entries: int = 4096,
+    ):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self._vectors = None                       # (容量, 维度) 的归一化向量矩阵
+        self._expires = np.empty(0, dtype=np.float64)
+        self._questions: List[Union[str, None]] = []
+        self._answers: List[Union[str, None]] = []
+        self._size = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self._hit_similarity_sum = 0.0
+        self._best_similarity_sum = 0.0
+
+    def embed(self, text: str) -> np.ndarray:
+        vector = np.asarray(self.embedder.get_embedding(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _usable(self, embedding: np.ndarray) -> bool:
+        """embedder 出错时会返回空向量；维度与已有记录不一致的向量也不能参与比较"""
+        return embedding.size > 0 and (self._vectors is None or embedding.shape[0] == self._vectors.shape[1])
+
+    def lookup(self, text: str) -> SemanticMatch:
+        """查找与 `text` 最相似且未过期的记录，相似度达到阈值时命中；向量不可用时按未命中处理"""
+        embedding = self.embed(text)
+        with self._lock:
+            best_index, best_similarity = -1, 0.0
+            if self._size and self._usable(embedding):
+                similarities = self._vectors[:self._size] @ embedding
+                similarities[self._expires[:self._size] <= time.time()] = -1.0
+                best_index = int(np.argmax(similarities))
+                best_similarity = float(similarities[best_index])
+
+            self._best_similarity_sum += max(best_similarity, 0.0)
+            if best_index >= 0 and best_similarity >= self.threshold:
+                self.hits += 1
+                self._hit_similarity_sum += best_similarity
+                return SemanticMatch(self._answers[best_index], best_similarity, embedding, self._questions[best_index])
+            self.misses += 1
+            return SemanticMatch(None, best_similarity, embedding)
+
+    def add(self, text: str, answer: str, embedding: Union[np.ndarray, None] = None, ttl: Union[float, None] = None) -> None:
+        """写入一条问答记录；`embedding` 可复用 `lookup` 返回的向量，`ttl` 覆盖默认过期时间；向量为空或维度不符时不写入"""
+        if embedding is None:
+            embedding = self.embed(text)
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.time() + ttl if ttl else np.inf
+
+        with self._lock:
+            if not self._usable(embedding):
+                return
+            if self._vectors is None:
+                self._vectors = np.zeros((16, embedding.shape[0]), dtype=np.float32)
+                self._expires = np.zeros(16, dtype=np.float64)
+            index = self._slot_for_insert()
+            self._vectors[index] = embedding
+            self._expires[index] = expires
+            if index == len(self._questions):
+                self._questions.append(text)
+                self._answers.append(answer)
+            else:
+                self._questions[index] = text
+                self._answers[index] = answer
+
+    def _slot_for_insert(self) -> int:
+        """优先复用过期的位置；满了则淘汰最早过期的记录，否则按需扩容"""
+        expired = np.flatnonzero(self._expires[:self._size] <= time.time())
+        if expired.size:
+            return int(expired[0])
+        if self._size >= self.max_entries:
+            return int(np.argmin(self._expires[:self._size]))
+        if self._size == self._vectors.shape[0]:
+            capacity = min(self.max_entries, self._size * 2)
+            self._vectors = np.resize(self._vectors, (capacity, self._vectors.shape[1]))
+            self._expires = np.resize(self._expires, capacity)
+        self._size += 1
+        return self._size - 1
+
+    def invalidate(self) -> None:
+        """知识库内容变化后清空全部缓存"""
+        with self._lock:
+            self._vectors = None
+            self._expires = np.empty(0, dtype=np.float64)
+            self._questions = []
+            self._answers = []
+            self._size = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return int(np.count_nonzero(self._expires[:self._size] > time.time()))
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "mean_hit_similarity": round(self._hit_similarity_sum / self.hits, 4) if self.hits else 0.0,
+            "mean_best_similarity": round(self._best_similarity_sum / lookups, 4) if lookups else 0.0,
+            "threshold": self.threshold,
+        }
@@ -0,0 +1,41 @@
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Iterator, Optional
+
+from agno.models.groq import Groq
+
+from models.rate_limiter import RateLimiter, estimate_request_tokens
+
+
+@dataclass
+class RateLimitedGroq(Groq):
+    """在 agno 的 Groq 模型外加一层客户端限流，每次调用模型前先向 `rate_limiter` 申请配额
+
+    多个 Agent / 多个 worker 共享同一个 `RateLimiter`（SQLite 后端）即可共用 Groq 的 RPM/TPM 配额。
+    """
+
+    rate_limiter: Optional[RateLimiter] = None
+
+    def _estimate(self, args: tuple, kwargs: dict) -> int:
+        messages = kwargs.get("messages", args[0] if args else [])
+        return estimate_request_tokens(messages or [], getattr(self, "max_tokens", None))
+
+    def invoke(self, *args, **kwargs) -> Any:
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(self._estimate(args, kwargs))
+        return super().invoke(*args, **kwargs)
+
+    async def ainvoke(self, *args, **kwargs) -> Any:
+        if self.rate_limiter is not None:
+            await self.rate_limiter.aacquire(self._estimate(args, kwargs))
+        return await super().ainvoke(*args, **kwargs)
+
+    def invoke_stream(self, *args, **kwargs) -> Iterator[Any]:
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(self._estimate(args, kwargs))
+        yield from super().invoke_stream(*args, **kwargs)
+
+    async def ainvoke_stream(self, *args, **kwargs) -> AsyncIterator[Any]:
+        if self.rate_limiter is not None:
+            await self.rate_limiter.aacquire(self._estimate(args, kwargs))
+        async for chunk in super().ainvoke_stream(*args, **kwargs):
+            yield chunk
@@ -0,0 +1,194 @@
+import json
+import threading
+from typing import Any, Callable, List, Union
+
+from models.rate_limiter import estimate_text_tokens
+
+
+# 运行摘要消息的标记，便于在消息列表中找到并原地更新
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+
+def _field(message: Any, key: str):
+    """兼容 dict 和 ollama 的 Message 对象"""
+    return message.get(key) if isinstance(message, dict) else getattr(message, key, None)
+
+
+def message_tokens(message: Any) -> int:
+    """估算单条消息的 token 数（内容 + 工具调用参数 + 固定开销）"""
+    total = 4
+    content = _field(message, "content")
+    if content:
+        total += estimate_text_tokens(content if isinstance(content, str) else json.dumps(content, ensure_ascii=False, default=str))
+    tool_calls = _field(message, "tool_calls")
+    if tool_calls:
+        total += estimate_text_tokens(json.dumps(tool_calls, ensure_ascii=False, default=str))
+    return total
+
+
+def render_transcript(messages: List[Any], max_chars: int = 500) -> str:
+    """把消息转成摘要用的纯文本，过长的内容（如工具输出）截断"""
+    lines = []
+    for message in messages:
+        content = str(_field(message, "content") or "")
+        if len(content) > max_chars:
+            content = content[:max_chars] + "…"
+        name = _field(message, "name")
+        role = _field(message, "role") or ""
+        lines.append(f"{role}{f' ({name})' if name else ''}: {content}")
+    return "\n".join(lines)
+
+
+class ConversationWindow:
+    """按 token 预算裁剪对话历史，每次调用模型前执行 `fit(messages)`
+
+    - 每条消息的 token 数只在第一次出现时估算，之后按对象身份复用
+    - 始终保留开头的 system prompt 和最近一轮（最后一条 user 消息及之后的 assistant/tool 消息，含未完成的工具调用）
+    - 超出预算时先截断旧轮次中的工具输出，再按整轮移除最旧的对话，工具调用和结果不会被拆开
+    - 传入 `summarize_fn(summary, transcript) -> str` 时，被移除的轮次在后台线程并入运行摘要，
+      摘要完成后在下一次 `fit` 时以一条 system 消息放在 system prompt 之后
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 4000,
+        reserve_tokens: int = 0,
+        max_tool_tokens: int = 200,
+        summarize_fn: Union[Callable[[str, str], str], None] = None,
+    ):
+        self.max_tokens = max_tokens
+        self.reserve_tokens = reserve_tokens      # 工具定义、预计输出等不在 messages 中的开销
+        self.max_tool_tokens = max_tool_tokens    # 旧轮次中单条工具输出保留的 token 数
+        self.summarize_fn = summarize_fn
+
+        self.summary = ""
+        self._cache: List[tuple] = []             # [(message, tokens)]，与 messages 按位置对齐
+        self._lock = threading.Lock()
+        self._pending: List[Any] = []             # 等待并入摘要的旧消息
+        self._worker: Union[threading.Thread, None] = None
+        self._summarizing = False                 # 是否有摘要线程在处理 pending，受 _lock 保护
+
+    # ---- token 统计 ----
+
+    def _counts(self, messages: List[Any]) -> List[int]:
+        cache = self._cache
+        counts = []
+        for i, message in enumerate(messages):
+            if i < len(cache) and cache[i][0] is message:
+                counts.append(cache[i][1])
+            else:
+                counts.append(message_tokens(message))
+        self._cache = list(zip(messages, counts))
+        return counts
+
+    def count(self, messages: List[Any]) -> int:
+        return sum(self._counts(messages)) + self.reserve_tokens
+
+    # ---- 裁剪 ----
+
+    @staticmethod
+    def _turn_starts(messages: List[Any], head: int) -> List[int]:
+        return [i for i in range(head, len(messages)) if _field(messages[i], "role") == "user"]
+
+    def _head(self, messages: List[Any]) -> int:
+        """开头需要保留的 system prompt 和摘要消息个数"""
+        head = 0
+        while head < len(messages) and _field(messages[head], "role") == "system":
+            head += 1
+        return head
+
+    def _truncate_tool_outputs(self, messages: List[Any], end: int) -> None:
+        limit = self.max_tool_tokens * 4
+        for i in range(self._head(messages), end):
+            message = messages[i]
+            if not isinstance(message, dict) or message.get("role") != "tool":
+                continue
+            content = message.get("content")
+            if isinstance(content, str) and message_tokens(message) > self.max_tool_tokens + 4:
+                messages[i] = dict(message, content=content[:limit] + "…（已截断）")
+
+    def fit(self, messages: List[Any]) -> List[Any]:
+        """原地裁剪 `messages` 使其不超过预算，返回同一个列表"""
+        self._apply_summary(messages)
+        if self.count(messages) <= self.max_tokens:
+            return messages
+
+        head = self._head(messages)
+        starts = self._turn_starts(messages, head)
+        if not starts:
+            return messages
+        current = starts[-1]
+
+        self._truncate_tool_outputs(messages, current)
+        counts = self._counts(messages)
+        total = sum(counts) + self.reserve_tokens
+
+        # 按整轮移除最旧的对话，最近一轮始终保留
+        cut = head
+        for start in starts[1:] or [current]:
+            if total <= self.max_tokens or cut >= current:
+                break
+            total -= sum(counts[cut:start])
+            cut = start
+        if cut == head:
+            return messages
+
+        dropped = messages[head:cut]
+        del messages[head:cut]
+        del self._cache[head:cut]
+        print(f"✂️ 上下文超出预算，移除 {len(dropped)} 条旧消息，当前约 {total} tokens")
+        if self.summarize_fn is not None:
+            self._summarize_later(dropped)
+        return messages
+
+    # ---- 运行摘要 ----
+
+    def _summarize_later(self, dropped: List[Any]) -> None:
+        with self._lock:
+            self._pending.extend(dropped)
+            if self._summarizing:
+                return  # 在途的摘要线程退出前会处理新加入的消息
+            self._summarizing = True
+            self._worker = threading.Thread(target=self._summarize, name="context-summary", daemon=True)
+            self._worker.start()
+
+    def _summarize(self) -> None:
+        """同一时间只有一个摘要线程；pending 为空并清除 `_summarizing` 在同一把锁内完成，新移除的消息不会滞留"""
+        while True:
+            with self._lock:
+                pending, self._pending = self._pending, []
+                summary = self.summary
+                if not pending:
+                    self._summarizing = False
+                    return
+            try:
+                summary = self.summarize_fn(summary, render_transcript(pending))
+            except Exception as e:
+                print(f"⚠️ 生成对话摘要失败: {e}")
+                with self._lock:
+                    # 放回队首，下次移除旧消息时连同新消息一起重试
+                    self._pending[:0] = pending
+                    self._summarizing = False
+                return
+            with self._lock:
+                self.summary = (summary or "").strip()
+
+    def _apply_summary(self, messages: List[Any]) -> None:
+        """把最新的摘要写入 system prompt 之后的摘要消息（没有则插入一条）"""
+        with self._lock:
+            summary = self.summary
+        if not summary:
+            return
+        content = SUMMARY_PREFIX + summary
+        head = 0
+        while head < len(messages) and _field(messages[head], "role") == "system":
+            existing = _field(messages[head], "content") or ""
+            if isinstance(existing, str) and existing.startswith(SUMMARY_PREFIX):
+                if existing != content:
+                    messages[head] = {"role": "system", "content": content}
+                return
+            head += 1
+        message = {"role": "system", "content": content}
+        messages.insert(head, message)
+        if len(self._cache) >= head:
+            self._cache.insert(head, (message, message_tokens(message)))
@@ -1,57 +1,504 @@
 import os
+import time
+import asyncio
 import httpx
 import json
-from typing import Any, Union, Mapping
+from typing import Any, Union, Mapping, Iterator, Iterable, AsyncIterator
+
+from models.retry import RetryPolicy
+from models.rate_limiter import RateLimiter, estimate_request_tokens
+from models.key_pool import KeyPool
+from models.llm_cache import ResponseCache, cache_key
+
+try:
+    import orjson  # 可选：更快的 JSON 解码
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+
+# 默认连接池配置：保持长连接，避免每次请求都重新握手 TCP+TLS
+DEFAULT_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30.0)
+# 异步客户端面向高并发服务，池子放大一些
+DEFAULT_ASYNC_LIMITS = httpx.Limits(max_connections=512, max_keepalive_connections=128, keepalive_expiry=30.0)
+DEFAULT_MAX_CONCURRENCY = 256
+CHAT_COMPLETIONS_PATH = "/openai/v1/chat/completions"
+# 单次调用（含所有重试）的默认总时限，单位秒
+DEFAULT_RETRY_DEADLINE = 60.0
+
+
+def _http2_available() -> bool:
+    """HTTP/2 需要额外安装 `h2` 包"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class _Field:
+    """按需从原始 dict 读取字段的描述符，不在构造时复制属性
+
+    非数据描述符：首次访问后把值写入实例 `__dict__`，之后的访问直接命中实例属性，不再经过描述符。
+    可变的默认值（如 `{}`）用 `default_factory` 生成，每个对象一份，避免所有响应共享同一个对象。
+    """
+
+    __slots__ = ("key", "default", "falsy_default", "default_factory", "name")
+
+    def __init__(self, key: str, default: Any = None, falsy_default: bool = False, default_factory=None):
+        self.key = key
+        self.default = default
+        self.falsy_default = falsy_default  # 为 True 时 null/空值也回落到默认值
+        self.default_factory = default_factory
+        self.name = key
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, owner):
+        if obj is None:
+            return self
+        data = obj._data
+        if self.key in data:
+            value = data[self.key]
+            if self.falsy_default and not value:
+                value = self.default
+        else:
+            value = self.default_factory() if self.default_factory is not None else self.default
+        obj.__dict__[self.name] = value
+        return value
+
+
+class _Nested:
+    """按需构造嵌套对象（或对象列表），首次访问后缓存到实例 `__dict__`"""
+
+    __slots__ = ("key", "factory", "many", "name")
+
+    def __init__(self, key: str, factory, many: bool):
+        self.key = key
+        self.factory = factory
+        self.many = many
+        self.name = key
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, owner):
+        if obj is None:
+            return self
+        raw = obj._data.get(self.key)
+        value = [self.factory(item) for item in raw or ()] if self.many else self.factory(raw or {})
+        obj.__dict__[self.name] = value
+        return value
+
+
+class _LazyObject:
+    """只持有原始 dict 的轻量响应对象，字段在访问时才解析并缓存为实例属性"""
 
+    def __init__(self, data: dict):
+        self._data = data
+
+    def model_dump(self) -> dict:
+        """返回原始数据（与 SDK 的 pydantic 对象用法一致）"""
+        return self._data
 
-class ToolFunction:
-    """模拟 Groq SDK 的工具调用 `function` 结构"""
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self._data!r})"
 
-    def __init__(self, function: dict):
-        self.name = function.get("name", "")
-        self.arguments = function.get("arguments", "{}")
 
+class ToolFunction(_LazyObject):
+    """模拟 Groq SDK 的工具调用 `function` 结构
 
-class ToolCall:
-    """模拟 Groq SDK 的工具调用 `tool_calls` 结构"""
+    工具调用一旦被访问，几乎每个字段都会被读取，按需解析反而多出每个字段一次描述符调用，这里在构造时直接取值。
+    """
 
-    def __init__(self, tool_call: dict):
-        self.id = tool_call.get("id", "")
-        self.type = tool_call.get("type", "function")
-        self.function = ToolFunction(tool_call.get("function", {}))
+    def __init__(self, data: dict):
+        self._data = data
+        self.name = data.get("name", "")
+        self.arguments = data.get("arguments", "{}")
 
 
-class ChatMessage:
+class ToolCall(_LazyObject):
+    """模拟 Groq SDK 的工具调用 `tool_calls` 结构（构造时直接取值，原因同 `ToolFunction`）"""
+
+    def __init__(self, data: dict):
+        self._data = data
+        self.id = data.get("id", "")
+        self.type = data.get("type", "function")
+        self.function = ToolFunction(data.get("function") or {})
+
+
+class ChatMessage(_LazyObject):
     """模拟 Groq SDK 的 message 结构"""
 
-    def __init__(self, message: dict):
-        self.role = message.get("role", "assistant")
-        self.content = message.get("content", "")
-        self.tool_calls = [ToolCall(tc) for tc in message.get("tool_calls", [])]
+    role = _Field("role", "assistant")
+    content = _Field("content", "")
+    tool_calls = _Nested("tool_calls", ToolCall, many=True)
 
 
-class ChatChoice:
+class ChatChoice(_LazyObject):
     """模拟 Groq SDK 的 choices 结构"""
 
-    def __init__(self, choice: dict):
-        self.index = choice.get("index", 0)
-        self.message = ChatMessage(choice.get("message", {}))
-        self.logprobs = choice.get("logprobs", None)
-        self.finish_reason = choice.get("finish_reason", "stop")
+    index = _Field("index", 0)
+    message = _Nested("message", ChatMessage, many=False)
+    logprobs = _Field("logprobs")
+    finish_reason = _Field("finish_reason", "stop")
 
 
-class ChatCompletionResponse:
-    """模拟 Groq SDK 返回的完整 response"""
+class ChatCompletionResponse(_LazyObject):
+    """模拟 Groq SDK 返回的完整 response，`usage`、`x_groq` 等字段只在访问时读取"""
 
-    def __init__(self, data: dict):
-        self.id = data.get("id")
-        self.object = data.get("object")
-        self.created = data.get("created")
-        self.model = data.get("model")
-        self.choices = [ChatChoice(choice) for choice in data.get("choices", [])]
-        self.usage = data.get("usage", {})
-        self.system_fingerprint = data.get("system_fingerprint", "")
-        self.x_groq = data.get("x_groq", {})
+    id = _Field("id")
+    object = _Field("object")
+    created = _Field("created")
+    model = _Field("model")
+    choices = _Nested("choices", ChatChoice, many=True)
+    usage = _Field("usage", default_factory=dict)
+    system_fingerprint = _Field("system_fingerprint", "")
+    x_groq = _Field("x_groq", default_factory=dict)
+
+
+class ChoiceDeltaFunction(_LazyObject):
+    """流式增量中的 `function` 片段，name/arguments 可能只有一部分"""
+
+    name = _Field("name")
+    arguments = _Field("arguments", "", falsy_default=True)
+
+
+class ChoiceDeltaToolCall(_LazyObject):
+    """流式增量中的 `tool_calls` 片段，按 `index` 拼接"""
+
+    index = _Field("index", 0)
+    id = _Field("id")
+    type = _Field("type")
+    function = _Nested("function", ChoiceDeltaFunction, many=False)
+
+
+class ChoiceDelta(_LazyObject):
+    """模拟 Groq SDK 的 `choices[].delta` 结构"""
+
+    role = _Field("role")
+    content = _Field("content", "", falsy_default=True)
+    tool_calls = _Nested("tool_calls", ChoiceDeltaToolCall, many=True)
+
+
+class ChunkChoice(_LazyObject):
+    """模拟 Groq SDK 流式 chunk 的 choices 结构"""
+
+    index = _Field("index", 0)
+    delta = _Nested("delta", ChoiceDelta, many=False)
+    logprobs = _Field("logprobs")
+    finish_reason = _Field("finish_reason")
+
+
+class ChatCompletionChunk(_LazyObject):
+    """模拟 Groq SDK 流式返回的单个 chunk"""
+
+    id = _Field("id")
+    object = _Field("object")
+    created = _Field("created")
+    model = _Field("model")
+    choices = _Nested("choices", ChunkChoice, many=True)
+    system_fingerprint = _Field("system_fingerprint", "")
+    x_groq = _Field("x_groq", default_factory=dict)
+
+
+class SSEDecoder:
+    """逐行解码 SSE，事件结束（空行）时返回拼接好的 `data:` 内容"""
+
+    def __init__(self):
+        self._data = []
+
+    def decode(self, line: str) -> Union[str, None]:
+        if not line:
+            return self.flush()
+        if line.startswith(":"):
+            return None  # 注释/心跳行
+        field, _, value = line.partition(":")
+        if field == "data":
+            self._data.append(value[1:] if value.startswith(" ") else value)
+        return None
+
+    def flush(self) -> Union[str, None]:
+        if not self._data:
+            return None
+        data, self._data = "\n".join(self._data), []
+        return data
+
+
+def iter_sse_data(lines: Iterable[str]) -> Iterator[str]:
+    """按 SSE 协议拼接 `data:` 行，每个事件产出一次"""
+    decoder = SSEDecoder()
+    for line in lines:
+        data = decoder.decode(line)
+        if data is not None:
+            yield data
+    data = decoder.flush()
+    if data is not None:
+        yield data
+
+
+async def aiter_sse_data(lines: AsyncIterator[str]) -> AsyncIterator[str]:
+    """`iter_sse_data` 的异步版本"""
+    decoder = SSEDecoder()
+    async for line in lines:
+        data = decoder.decode(line)
+        if data is not None:
+            yield data
+    data = decoder.flush()
+    if data is not None:
+        yield data
+
+
+def parse_sse_event(data: str) -> Union[ChatCompletionChunk, None]:
+    """解析一个 SSE 事件，遇到 `[DONE]` 返回 None"""
+    if data.strip() == "[DONE]":
+        return None
+    event = json_loads(data)
+    if "error" in event:
+        raise RuntimeError(f"❌ 流式响应错误: {event['error']}")
+    return ChatCompletionChunk(event)
+
+
+class Stream:
+    """模拟 Groq SDK 的 `Stream`，边接收字节边产出 ChatCompletionChunk"""
+
+    def __init__(self, response: httpx.Response, on_close=None):
+        self.response = response
+        self._on_close = on_close
+
+    def __iter__(self) -> Iterator[ChatCompletionChunk]:
+        try:
+            for data in iter_sse_data(self.response.iter_lines()):
+                chunk = parse_sse_event(data)
+                if chunk is None:
+                    break
+                yield chunk
+        except httpx.TimeoutException:
+            raise RuntimeError("❌ 流式读取超时")
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        """提前结束时释放连接，归还到连接池，可重复调用"""
+        self.response.close()
+        if self._on_close is not None:
+            on_close, self._on_close = self._on_close, None
+            on_close()
+
+    def __enter__(self) -> "Stream":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+class AsyncStream:
+    """`Stream` 的异步版本，支持 `async for`"""
+
+    def __init__(self, response: httpx.Response, on_close=None):
+        self.response = response
+        self._on_close = on_close
+
+    async def __aiter__(self) -> AsyncIterator[ChatCompletionChunk]:
+        try:
+            async for data in aiter_sse_data(self.response.aiter_lines()):
+                chunk = parse_sse_event(data)
+                if chunk is None:
+                    break
+                yield chunk
+        except httpx.TimeoutException:
+            raise RuntimeError("❌ 流式读取超时")
+        finally:
+            await self.aclose()
+
+    async def aclose(self) -> None:
+        """释放连接和并发名额，可重复调用"""
+        await self.response.aclose()
+        if self._on_close is not None:
+            on_close, self._on_close = self._on_close, None
+            on_close()
+
+    async def __aenter__(self) -> "AsyncStream":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.aclose()
+
+
+def build_chat_payload(
+    model: str,
+    messages: list,
+    temperature: float,
+    top_p: float,
+    n: int,
+    stream: bool,
+    stop: Union[str, list, None],
+    max_tokens: Union[int, None],
+    presence_penalty: float,
+    frequency_penalty: float,
+    logit_bias: Union[dict, None],
+    user: Union[str, None],
+    tools: Union[list, None],
+    tool_choice: str,
+) -> dict:
+    """构造 chat.completions 请求体，同步和异步客户端共用"""
+    payload = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "top_p": top_p,
+        "n": n,
+        "stream": stream,
+        "stop": stop,
+        "max_tokens": max_tokens,
+        "presence_penalty": presence_penalty,
+        "frequency_penalty": frequency_penalty,
+        "logit_bias": logit_bias,
+        "user": user
+    }
+
+    if tools is not None:
+        payload["tools"] = tools
+        payload["tool_choice"] = tool_choice
+    return payload
+
+
+def build_chat_request(client, payload: dict, endpoint=None) -> httpx.Request:
+    """根据客户端配置（base_url、默认请求头/查询参数、超时）构造请求，`endpoint` 来自 KeyPool 时使用其 key 和地址"""
+    api_key = endpoint.api_key if endpoint is not None else client.api_key
+    base_url = endpoint.base_url if endpoint is not None else client.base_url
+    url = base_url.rstrip("/") + CHAT_COMPLETIONS_PATH
+    headers = {
+        **client.default_headers,
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {api_key}"
+    }
+    return client.http_client.build_request(
+        "POST",
+        url,
+        headers=headers,
+        params=client.default_query or None,
+        json=payload,
+        timeout=client.timeout,
+    )
+
+
+def _retry_policy(client, max_retries: Union[int, None], retry_deadline: Union[float, None]) -> RetryPolicy:
+    """单次调用的重试预算，未指定时使用客户端配置"""
+    return RetryPolicy(
+        max_retries=client.max_retries if max_retries is None else max_retries,
+        deadline=client.retry_deadline if retry_deadline is None else retry_deadline,
+    )
+
+
+def _next_retry_delay(client, policy: RetryPolicy, attempt: int, endpoint, response: httpx.Response):
+    """计算 HTTP 错误后的重试等待，返回 (等待秒数, 下次使用的 endpoint)，不重试时等待为 None
+
+    401/429 时如果有另一个立即可用的 key，直接占用它并零等待重试；没有其他 key 时按正常的 jitter 退避。
+    """
+    pool = client.key_pool
+    can_switch = pool is not None and response.status_code in (401, 429)
+    if not can_switch and not policy.should_retry_response(response):
+        return None, None
+    delay = policy.next_delay(attempt, response)
+    if delay is None:
+        return None, None
+    if can_switch:
+        other = pool.acquire(exclude=endpoint, healthy_only=True)
+        if other is not None:
+            return 0.0, other
+        if not policy.should_retry_response(response):
+            return None, None
+    return delay, None
+
+
+def send_with_retries(client, payload: dict, stream: bool, policy: RetryPolicy):
+    """发送请求，对可重试的失败按退避策略重发；预算用完后返回最后一次的响应或抛出异常
+
+    返回 (response, endpoint)，使用 KeyPool 时调用方需在请求/流结束后 `release(endpoint)`。
+    首次发送前的限流由调用方完成；每次重试同样占用一次请求配额，发送前再向 `client.rate_limiter` 申请
+    （token 已在首次申请时预留，重试只计请求数）。
+    """
+    pool = client.key_pool
+    limiter = client.rate_limiter
+    attempt = 0
+    next_endpoint = None
+    while True:
+        if attempt and limiter is not None:
+            limiter.acquire()
+        endpoint = next_endpoint or (pool.acquire() if pool is not None else None)
+        next_endpoint = None
+        # 复用客户端的连接池，保持 keep-alive
+        request = build_chat_request(client, payload, endpoint)
+        try:
+            response = client.http_client.send(request, stream=stream)
+        except httpx.TransportError as e:
+            if pool is not None:
+                pool.release(endpoint)
+            delay = policy.next_delay(attempt) if policy.should_retry_error(e) else None
+            if delay is None:
+                raise
+            print(f"⚠️ 请求失败: {e}，{delay:.2f}s 后进行第 {attempt + 1} 次重试")
+        else:
+            if pool is not None:
+                pool.record(endpoint, response)
+            delay, next_endpoint = _next_retry_delay(client, policy, attempt, endpoint, response) if response.is_error else (None, None)
+            if delay is None:
+                return response, endpoint
+            response.close()
+            if pool is not None:
+                pool.release(endpoint)
+            print(f"⚠️ HTTP {response.status_code}，{delay:.2f}s 后进行第 {attempt + 1} 次重试")
+        time.sleep(delay)
+        attempt += 1
+
+
+async def asend_with_retries(client, payload: dict, stream: bool, policy: RetryPolicy):
+    """`send_with_retries` 的异步版本"""
+    pool = client.key_pool
+    limiter = client.rate_limiter
+    attempt = 0
+    next_endpoint = None
+    while True:
+        if attempt and limiter is not None:
+            await limiter.aacquire()
+        endpoint = next_endpoint or (pool.acquire() if pool is not None else None)
+        next_endpoint = None
+        request = build_chat_request(client, payload, endpoint)
+        try:
+            response = await client.http_client.send(request, stream=stream)
+        except httpx.TransportError as e:
+            if pool is not None:
+                pool.release(endpoint)
+            delay = policy.next_delay(attempt) if policy.should_retry_error(e) else None
+            if delay is None:
+                raise
+            print(f"⚠️ 请求失败: {e}，{delay:.2f}s 后进行第 {attempt + 1} 次重试")
+        else:
+            if pool is not None:
+                pool.record(endpoint, response)
+            delay, next_endpoint = _next_retry_delay(client, policy, attempt, endpoint, response) if response.is_error else (None, None)
+            if delay is None:
+                return response, endpoint
+            await response.aclose()
+            if pool is not None:
+                pool.release(endpoint)
+            print(f"⚠️ HTTP {response.status_code}，{delay:.2f}s 后进行第 {attempt + 1} 次重试")
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+def _release_callback(*callbacks):
+    """把多个释放动作合并成一个，供 Stream 关闭时调用"""
+    callbacks = [cb for cb in callbacks if cb is not None]
+    if not callbacks:
+        return None
+
+    def release():
+        for cb in callbacks:
+            cb()
+    return release
 
 
 class ChatCompletions:
@@ -76,42 +523,67 @@ class ChatCompletions:
         user: Union[str, None] = None,
         tools: Union[list, None] = None,
         tool_choice: str = "auto",
-    ) -> ChatCompletionResponse:
-        """模拟 chat.completions.create() 方法"""
-        url = "https://api.groq.com/openai/v1/chat/completions"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.client.api_key}"
-        }
-
-        payload = {
-            "model": model,
-            "messages": messages,
-            "temperature": temperature,
-            "top_p": top_p,
-            "n": n,
-            "stream": stream,
-            "stop": stop,
-            "max_tokens": max_tokens,
-            "presence_penalty": presence_penalty,
-            "frequency_penalty": frequency_penalty,
-            "logit_bias": logit_bias,
-            "user": user
-        }
-
-        if tools is not None:
-            payload["tools"] = tools
-            payload["tool_choice"] = tool_choice
-
+        max_retries: Union[int, None] = None,
+        retry_deadline: Union[float, None] = None,
+        cache: Union[bool, None] = None,
+    ) -> Union[ChatCompletionResponse, Stream]:
+        """模拟 chat.completions.create() 方法，`stream=True` 时返回逐块产出的 Stream
+
+        429/5xx 和连接失败会按 full jitter 指数退避自动重试，并优先遵循服务端的
+        `Retry-After` / `x-ratelimit-reset-*`；`max_retries`、`retry_deadline` 可按次覆盖客户端配置。
+        客户端配置了 `response_cache` 时，非流式请求先查缓存；`cache=True/False` 可按次强制使用/跳过缓存。
+        """
+        payload = build_chat_payload(
+            model=model, messages=messages, temperature=temperature, top_p=top_p, n=n, stream=stream,
+            stop=stop, max_tokens=max_tokens, presence_penalty=presence_penalty,
+            frequency_penalty=frequency_penalty, logit_bias=logit_bias, user=user,
+            tools=tools, tool_choice=tool_choice,
+        )
+        response_cache, key = self.client.response_cache, None
+        if response_cache is not None and not stream and response_cache.should_cache(temperature, cache):
+            key = cache_key(**payload)
+            cached = response_cache.get(key)
+            if cached is not None:
+                return ChatCompletionResponse(cached)
+
+        policy = _retry_policy(self.client, max_retries, retry_deadline)
+
+        # 客户端侧限流：先拿到请求数和 token 配额再发送
+        limiter = self.client.rate_limiter
+        estimated_tokens = 0
+        if limiter is not None:
+            estimated_tokens = estimate_request_tokens(messages, max_tokens, tools)
+            limiter.acquire(estimated_tokens)
+
+        pool = self.client.key_pool
+        release = None
         try:
-            response = httpx.post(url, headers=headers, json=payload, timeout=10)
+            response, endpoint = send_with_retries(self.client, payload, stream, policy)
+            if pool is not None:
+                release = lambda: pool.release(endpoint)
+            if stream:
+                if response.is_error:
+                    response.read()
+                    response.close()
+                response.raise_for_status()
+                stream_response = Stream(response, on_close=release)
+                release = None  # 在途计数交给流管理
+                return stream_response  # ✅ 不等待完整响应，直接返回流
+
             response.raise_for_status()  # 如果 HTTP 状态码不是 2xx，则触发异常
-            data = response.json()
+            data = json_loads(response.content)
+            if limiter is not None:
+                limiter.reconcile(estimated_tokens, (data.get("usage") or {}).get("total_tokens"))
+            if key is not None:
+                response_cache.set(key, data)
             return ChatCompletionResponse(data)  # ✅ 确保返回 Groq SDK 兼容的对象
         except httpx.TimeoutException:
             raise RuntimeError("❌ 请求超时")
         except httpx.RequestError as e:
             raise RuntimeError(f"❌ 请求失败: {str(e)}")
+        finally:
+            if release is not None:
+                release()
 
 
 class Chat:
@@ -121,6 +593,95 @@ class Chat:
         self.completions = ChatCompletions(client)
 
 
+class AsyncChatCompletions:
+    """模拟 `client.chat.completions` 的异步版本"""
+
+    def __init__(self, client):
+        self.client = client
+
+    async def create(
+        self,
+        model: str,
+        messages: list,
+        temperature: float = 0.6,
+        top_p: float = 1.0,
+        n: int = 1,
+        stream: bool = False,
+        stop: Union[str, list, None] = None,
+        max_tokens: Union[int, None] = None,
+        presence_penalty: float = 0.0,
+        frequency_penalty: float = 0.0,
+        logit_bias: Union[dict, None] = None,
+        user: Union[str, None] = None,
+        tools: Union[list, None] = None,
+        tool_choice: str = "auto",
+        max_retries: Union[int, None] = None,
+        retry_deadline: Union[float, None] = None,
+        cache: Union[bool, None] = None,
+    ) -> Union[ChatCompletionResponse, AsyncStream]:
+        """异步 chat.completions.create()，`stream=True` 时返回可 `async for` 的 AsyncStream，重试规则同 `Groq`"""
+        payload = build_chat_payload(
+            model=model, messages=messages, temperature=temperature, top_p=top_p, n=n, stream=stream,
+            stop=stop, max_tokens=max_tokens, presence_penalty=presence_penalty,
+            frequency_penalty=frequency_penalty, logit_bias=logit_bias, user=user,
+            tools=tools, tool_choice=tool_choice,
+        )
+        response_cache, key = self.client.response_cache, None
+        if response_cache is not None and not stream and response_cache.should_cache(temperature, cache):
+            key = cache_key(**payload)
+            cached = response_cache.get(key)
+            if cached is not None:
+                return ChatCompletionResponse(cached)
+
+        policy = _retry_policy(self.client, max_retries, retry_deadline)
+
+        limiter = self.client.rate_limiter
+        estimated_tokens = 0
+        if limiter is not None:
+            estimated_tokens = estimate_request_tokens(messages, max_tokens, tools)
+            await limiter.aacquire(estimated_tokens)
+
+        # 并发名额：非流式请求结束即释放，流式请求在流关闭时释放
+        semaphore = self.client.semaphore
+        pool = self.client.key_pool
+        await semaphore.acquire()
+        release = semaphore.release
+        try:
+            response, endpoint = await asend_with_retries(self.client, payload, stream, policy)
+            if pool is not None:
+                release = _release_callback(release, lambda: pool.release(endpoint))
+            if stream:
+                if response.is_error:
+                    await response.aread()
+                    await response.aclose()
+                response.raise_for_status()
+                stream_response = AsyncStream(response, on_close=release)
+                release = None  # 名额交给流管理
+                return stream_response
+
+            response.raise_for_status()
+            data = json_loads(response.content)
+            if limiter is not None:
+                limiter.reconcile(estimated_tokens, (data.get("usage") or {}).get("total_tokens"))
+            if key is not None:
+                response_cache.set(key, data)
+            return ChatCompletionResponse(data)
+        except httpx.TimeoutException:
+            raise RuntimeError("❌ 请求超时")
+        except httpx.RequestError as e:
+            raise RuntimeError(f"❌ 请求失败: {str(e)}")
+        finally:
+            if release is not None:
+                release()
+
+
+class AsyncChat:
+    """模拟 `client.chat` 的异步版本"""
+
+    def __init__(self, client):
+        self.completions = AsyncChatCompletions(client)
+
+
 class Groq:
     """模拟 `groq.Groq` 客户端"""
 
@@ -133,21 +694,67 @@ class Groq:
         default_headers: Union[Mapping[str, str], None] = None,
         default_query: Union[Mapping[str, Any], None] = None,
         http_client: Union[httpx.Client, None] = None,
+        http2: bool = False,
+        limits: Union[httpx.Limits, None] = None,
+        retry_deadline: Union[float, None] = DEFAULT_RETRY_DEADLINE,
+        rate_limiter: Union[RateLimiter, None] = None,
+        key_pool: Union[KeyPool, None] = None,
+        response_cache: Union[ResponseCache, None] = None,
         _strict_response_validation: bool = False,
     ):
-        """构造新的 Groq 客户端"""
+        """构造新的 Groq 客户端
+
+        未传入 `http_client` 时，客户端自己创建并持有一个长连接池，
+        `limits` 控制池大小和 keep-alive 过期时间，`http2=True` 在安装了 `h2` 时启用 HTTP/2。
+        `max_retries` 为每次调用的重试次数上限，`retry_deadline` 为含重试在内的总时限（秒）。
+        `rate_limiter` 用于在发送前按请求数/token 数限流，可在多个客户端或进程间共享。
+        `key_pool` 在多个 key / base_url 之间分摊请求（见 `KeyPool.from_env()`），此时忽略 `api_key`、`base_url`。
+        `response_cache` 为非流式请求提供精确匹配缓存。
+        """
+        self.key_pool = key_pool
+        self.response_cache = response_cache
         self.api_key = api_key or os.getenv("GROQ_API_KEY")
+        if not self.api_key and key_pool is not None:
+            self.api_key = key_pool.endpoints[0].api_key
         if not self.api_key:
             raise ValueError("❌ API Key 未设置")
 
         self.base_url = base_url
         self.timeout = timeout
         self.max_retries = max_retries
+        self.retry_deadline = retry_deadline
+        self.rate_limiter = rate_limiter
         self.default_headers = default_headers or {}
         self.default_query = default_query or {}
+        self.http2 = http2
+        self.limits = limits or DEFAULT_LIMITS
+
+        # 只有自己创建的连接池才由自己关闭，外部传入或 copy() 共享的不关闭
+        self._owns_http_client = http_client is None
+        if http_client is None:
+            if http2 and not _http2_available():
+                print("⚠️ 未安装 h2，HTTP/2 不可用，回退到 HTTP/1.1")
+                http2 = False
+            http_client = httpx.Client(http2=http2, limits=self.limits, timeout=timeout)
+        self.http_client = http_client
 
         self.chat = Chat(self)
 
+    def close(self) -> None:
+        """关闭客户端持有的连接池"""
+        if self._owns_http_client and not self.http_client.is_closed:
+            self.http_client.close()
+
+    @property
+    def is_closed(self) -> bool:
+        return self.http_client.is_closed
+
+    def __enter__(self) -> "Groq":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
     def copy(
         self,
         api_key: str = None,
@@ -156,8 +763,9 @@ class Groq:
         max_retries: int = None,
         default_headers: Union[Mapping[str, str], None] = None,
         default_query: Union[Mapping[str, Any], None] = None,
+        http_client: Union[httpx.Client, None] = None,
     ) -> "Groq":
-        """复制当前客户端，并允许修改部分参数"""
+        """复制当前客户端，并允许修改部分参数（默认共享同一个连接池）"""
         return Groq(
             api_key=api_key or self.api_key,
             base_url=base_url or self.base_url,
@@ -165,24 +773,133 @@ class Groq:
             max_retries=max_retries if max_retries is not None else self.max_retries,
             default_headers=default_headers or self.default_headers,
             default_query=default_query or self.default_query,
+            http_client=http_client or self.http_client,
+            http2=self.http2,
+            limits=self.limits,
+            retry_deadline=self.retry_deadline,
+            rate_limiter=self.rate_limiter,
+            key_pool=self.key_pool,
+            response_cache=self.response_cache,
+        )
+
+
+class AsyncGroq:
+    """模拟 `groq.AsyncGroq` 客户端，供 asyncio 服务（如 FastAPI）使用"""
+
+    def __init__(
+        self,
+        api_key: str = None,
+        base_url: str = "https://api.groq.com",
+        timeout: Union[float, None] = 10,
+        max_retries: int = 3,
+        default_headers: Union[Mapping[str, str], None] = None,
+        default_query: Union[Mapping[str, Any], None] = None,
+        http_client: Union[httpx.AsyncClient, None] = None,
+        http2: bool = False,
+        limits: Union[httpx.Limits, None] = None,
+        retry_deadline: Union[float, None] = DEFAULT_RETRY_DEADLINE,
+        rate_limiter: Union[RateLimiter, None] = None,
+        key_pool: Union[KeyPool, None] = None,
+        response_cache: Union[ResponseCache, None] = None,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        _semaphore: Union[asyncio.Semaphore, None] = None,
+    ):
+        """构造新的异步 Groq 客户端
+
+        `max_concurrency` 限制单个客户端同时在途的请求数（copy() 出来的客户端共享该限制），
+        连接池参数与 `Groq` 相同。
+        """
+        self.key_pool = key_pool
+        self.response_cache = response_cache
+        self.api_key = api_key or os.getenv("GROQ_API_KEY")
+        if not self.api_key and key_pool is not None:
+            self.api_key = key_pool.endpoints[0].api_key
+        if not self.api_key:
+            raise ValueError("❌ API Key 未设置")
+
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_deadline = retry_deadline
+        self.rate_limiter = rate_limiter
+        self.default_headers = default_headers or {}
+        self.default_query = default_query or {}
+        self.http2 = http2
+        self.limits = limits or DEFAULT_ASYNC_LIMITS
+        self.max_concurrency = max_concurrency
+        self.semaphore = _semaphore or asyncio.Semaphore(max_concurrency)
+
+        self._owns_http_client = http_client is None
+        if http_client is None:
+            if http2 and not _http2_available():
+                print("⚠️ 未安装 h2，HTTP/2 不可用，回退到 HTTP/1.1")
+                http2 = False
+            http_client = httpx.AsyncClient(http2=http2, limits=self.limits, timeout=timeout)
+        self.http_client = http_client
+
+        self.chat = AsyncChat(self)
+
+    async def close(self) -> None:
+        """关闭客户端持有的连接池"""
+        if self._owns_http_client and not self.http_client.is_closed:
+            await self.http_client.aclose()
+
+    @property
+    def is_closed(self) -> bool:
+        return self.http_client.is_closed
+
+    async def __aenter__(self) -> "AsyncGroq":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    def copy(
+        self,
+        api_key: str = None,
+        base_url: str = None,
+        timeout: Union[float, None] = None,
+        max_retries: int = None,
+        default_headers: Union[Mapping[str, str], None] = None,
+        default_query: Union[Mapping[str, Any], None] = None,
+        http_client: Union[httpx.AsyncClient, None] = None,
+    ) -> "AsyncGroq":
+        """复制当前客户端，并允许修改部分参数（默认共享连接池和并发限制）"""
+        return AsyncGroq(
+            api_key=api_key or self.api_key,
+            base_url=base_url or self.base_url,
+            timeout=timeout if timeout is not None else self.timeout,
+            max_retries=max_retries if max_retries is not None else self.max_retries,
+            default_headers=default_headers or self.default_headers,
+            default_query=default_query or self.default_query,
+            http_client=http_client or self.http_client,
+            http2=self.http2,
+            limits=self.limits,
+            retry_deadline=self.retry_deadline,
+            rate_limiter=self.rate_limiter,
+            key_pool=self.key_pool,
+            response_cache=self.response_cache,
+            max_concurrency=self.max_concurrency,
+            _semaphore=self.semaphore,
         )
 
 
 # **兼容官方 SDK 的方式**
 Client = Groq
+AsyncClient = AsyncGroq
 
 
 # **测试**
 if __name__ == "__main__":
-    client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-    messages = [{"role": "user", "content": "gta6 最新消息"}]
-
-    response = client.chat.completions.create(
-        model="qwen-qwq-32b",
-        messages=messages,
-        tools=[{"type": "function", "function": {"name": "google_search", "parameters": {"query": "string"}}}],
-        tool_choice="auto"
-    )
+    with Groq(api_key=os.getenv("GROQ_API_KEY")) as client:
+        messages = [{"role": "user", "content": "gta6 最新消息"}]
+
+        response = client.chat.completions.create(
+            model="qwen-qwq-32b",
+            messages=messages,
+            tools=[{"type": "function", "function": {"name": "google_search", "parameters": {"query": "string"}}}],
+            tool_choice="auto"
+        )
 
 
     print("✅ AI 回复:", response.choices[0].message.content)
@@ -1,5 +1,7 @@
 import os
-from typing import Optional, List, Iterator, Dict, Any, Mapping, Union
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Iterator, AsyncIterator, Dict, Any, Mapping, Union
 from phi.llm.base import LLM
 from phi.llm.message import Message
 from phi.utils.log import logger
@@ -8,11 +10,15 @@ from phi.utils.tools import get_function_call_for_tool_call
 from pydantic import Field
 
 try:
-    from groq import Groq
+    from groq import Groq, AsyncGroq
 except ImportError:
     logger.error("`groq` not installed")
     raise
 
+from models.groq_mock import Groq as PooledGroq, AsyncGroq as AsyncPooledGroq
+from models.key_pool import KeyPool
+from models.llm_cache import cache_key
+
 
 class GroqLLM(LLM):
     """Groq API 适配器，兼容 Ollama 的接口，并继承 LLM 以适配 Assistant"""
@@ -24,22 +30,35 @@ class GroqLLM(LLM):
     options: Optional[Any] = None
     keep_alive: Optional[Union[float, str]] = None
     client_kwargs: Optional[Dict[str, Any]] = None
-    groq_client: Optional[Groq] = Field(default=None, exclude=True)
+    groq_client: Optional[Any] = Field(default=None, exclude=True)
+    async_groq_client: Optional[Any] = Field(default=None, exclude=True)
+    temperature: float = 0.6
+    response_cache: Optional[Any] = Field(default=None, exclude=True)
 
     def __init__(self, model: str = "qwen-qwq-32b", **kwargs):
         super().__init__()  # 初始化 pydantic.BaseModel
 
+        # 配置了多个 key（GROQ_API_KEYS 逗号分隔）时，用 KeyPool 在这些 key 之间分摊请求
+        api_keys = [key for key in os.getenv("GROQ_API_KEYS", "").split(",") if key.strip()]
         api_key = os.getenv("GROQ_API_KEY")
-        if not api_key:
+        if len(api_keys) > 1:
+            key_pool = KeyPool.from_env()
+            self.groq_client = PooledGroq(key_pool=key_pool)
+            self.async_groq_client = AsyncPooledGroq(key_pool=key_pool)
+        elif api_keys or api_key:
+            self.groq_client = Groq(api_key=api_key or api_keys[0].strip())
+            self.async_groq_client = AsyncGroq(api_key=api_key or api_keys[0].strip())
+        else:
             raise ValueError("GROQ_API_KEY is not set in environment variables.")
-
-        self.groq_client = Groq(api_key=api_key)
         self.model = model
 
         self.timeout = kwargs.get("timeout", None)
         self.format = kwargs.get("format", None)
         self.options = kwargs.get("options", None)
         self.keep_alive = kwargs.get("keep_alive", None)
+        self.temperature = kwargs.get("temperature", 0.6)
+        # models.llm_cache.ResponseCache，命中时直接返回，不调用 API
+        self.response_cache = kwargs.get("response_cache", None)
 
     def api_kwargs(self) -> Dict[str, Any]:
         """构造 API 调用参数"""
@@ -56,40 +75,104 @@ class GroqLLM(LLM):
         """转换消息格式"""
         return {"role": message.role, "content": message.content}
 
+    def _parse_response(self, response) -> Mapping[str, Any]:
+        """把 Groq 返回的 response 转成 Assistant 需要的消息 dict"""
+        if not response.choices or not isinstance(response.choices, list):
+            logger.error(f"❌ Groq API 返回无效响应: {response}")
+            return {"role": "assistant", "content": "API 响应异常，请稍后重试。"}
+
+        first_choice = response.choices[0]
+
+        if hasattr(first_choice, "message") and hasattr(first_choice.message, "content"):
+            return {"role": "assistant", "content": first_choice.message.content.strip()}
+        elif hasattr(first_choice, "content"):
+            return {"role": "assistant", "content": first_choice.content.strip()}
+        else:
+            logger.error(f"❌ Groq API 解析失败: {response}")
+            return {"role": "assistant", "content": "API 响应异常，请稍后重试。"}
+
+    def _cache_lookup(self, llm_messages: List[Dict[str, Any]]):
+        """返回 (缓存 key, 命中的结果)；未配置缓存或不满足缓存条件时 key 为 None"""
+        if self.response_cache is None or not self.response_cache.should_cache(self.temperature):
+            return None, None
+        key = cache_key(model=self.model, messages=llm_messages, temperature=self.temperature, **self.api_kwargs())
+        return key, self.response_cache.get(key)
+
     def invoke(self, messages: List[Message]) -> Mapping[str, Any]:
         """同步调用 Groq API 获取响应"""
+        llm_messages = [self.to_llm_message(m) for m in messages]
+        key, cached = self._cache_lookup(llm_messages)
+        if cached is not None:
+            return cached
+
         response_timer = Timer()
         response_timer.start()
 
         try:
             response = self.groq_client.chat.completions.create(
                 model=self.model,
-                messages=[self.to_llm_message(m) for m in messages],
-                temperature=0.6,
+                messages=llm_messages,
+                temperature=self.temperature,
                 **self.api_kwargs()
             )
             response_timer.stop()
             logger.debug(f"Time to generate response: {response_timer.elapsed:.4f}s")
 
+            result = self._parse_response(response)
+            if key is not None and response.choices:
+                self.response_cache.set(key, result)
+            return result
+
+        except Exception as e:
+            logger.error(f"❌ 调用 Groq API 失败: {e}")
+            return {"role": "assistant", "content": "系统错误，请稍后重试。"}
+
+    async def ainvoke(self, messages: List[Message]) -> Mapping[str, Any]:
+        """异步调用 Groq API 获取响应，不阻塞事件循环"""
+        llm_messages = [self.to_llm_message(m) for m in messages]
+        key, cached = self._cache_lookup(llm_messages)
+        if cached is not None:
+            return cached
 
-            if not response.choices or not isinstance(response.choices, list):
-                logger.error(f"❌ Groq API 返回无效响应: {response}")
-                return {"role": "assistant", "content": "API 响应异常，请稍后重试。"}
+        response_timer = Timer()
+        response_timer.start()
 
-            first_choice = response.choices[0]
+        try:
+            response = await self.async_groq_client.chat.completions.create(
+                model=self.model,
+                messages=llm_messages,
+                temperature=self.temperature,
+                **self.api_kwargs()
+            )
+            response_timer.stop()
+            logger.debug(f"Time to generate response: {response_timer.elapsed:.4f}s")
 
-            if hasattr(first_choice, "message") and hasattr(first_choice.message, "content"):
-                return {"role": "assistant", "content": first_choice.message.content.strip()}
-            elif hasattr(first_choice, "content"):
-                return {"role": "assistant", "content": first_choice.content.strip()}
-            else:
-                logger.error(f"❌ Groq API 解析失败: {response}")
-                return {"role": "assistant", "content": "API 响应异常，请稍后重试。"}
+            result = self._parse_response(response)
+            if key is not None and response.choices:
+                self.response_cache.set(key, result)
+            return result
 
         except Exception as e:
             logger.error(f"❌ 调用 Groq API 失败: {e}")
             return {"role": "assistant", "content": "系统错误，请稍后重试。"}
 
+    def invoke_many(self, message_lists: List[List[Message]], max_concurrency: int = 8) -> List[Mapping[str, Any]]:
+        """并发执行多组对话，按输入顺序返回结果；单条失败只影响该条（返回错误提示消息）"""
+        if not message_lists:
+            return []
+        with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(message_lists)))) as executor:
+            return list(executor.map(self.invoke, message_lists))
+
+    async def ainvoke_many(self, message_lists: List[List[Message]], max_concurrency: int = 8) -> List[Mapping[str, Any]]:
+        """`invoke_many` 的异步版本"""
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+        async def run(messages: List[Message]) -> Mapping[str, Any]:
+            async with semaphore:
+                return await self.ainvoke(messages)
+
+        return list(await asyncio.gather(*(run(messages) for messages in message_lists)))
+
     def invoke_stream(self, messages: List[Message]) -> Iterator[Mapping[str, Any]]:
         """流式调用 Groq API 获取响应"""
         try:
@@ -97,7 +180,7 @@ class GroqLLM(LLM):
                 model=self.model,
                 messages=[self.to_llm_message(m) for m in messages],
                 stream=True,  # ✅ 确保使用流模式
-                temperature=0.6,
+                temperature=self.temperature,
                 **self.api_kwargs()
             )
 
@@ -125,6 +208,31 @@ class GroqLLM(LLM):
             print(f"🔥 Groq Stream 调用失败: {e}")
             yield {"role": "assistant", "content": "系统错误，请稍后重试。"}
 
+    async def ainvoke_stream(self, messages: List[Message]) -> AsyncIterator[Mapping[str, Any]]:
+        """异步流式调用 Groq API 获取响应"""
+        try:
+            response = await self.async_groq_client.chat.completions.create(
+                model=self.model,
+                messages=[self.to_llm_message(m) for m in messages],
+                stream=True,
+                temperature=self.temperature,
+                **self.api_kwargs()
+            )
+
+            async for chunk in response:
+                if hasattr(chunk, "choices") and chunk.choices:
+                    choice = chunk.choices[0]
+                    if hasattr(choice, "delta") and hasattr(choice.delta, "content"):
+                        yield {"role": "assistant", "content": choice.delta.content or ""}
+                    else:
+                        logger.error(f"❌ Groq Stream 解析失败: {chunk}")
+                else:
+                    logger.error(f"❌ Groq API Stream 返回无效数据: {chunk}")
+
+        except Exception as e:
+            logger.error(f"❌ Groq Stream 调用失败: {e}")
+            yield {"role": "assistant", "content": "系统错误，请稍后重试。"}
+
     def response(self, messages: List[Message]) -> str:
         """调用 Groq API 生成 LLM 响应"""
         response = self.invoke(messages)
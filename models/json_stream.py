@@ -0,0 +1,135 @@
+import json
+from typing import Any, Callable, Iterable, List, Union
+
+
+class JSONStreamScanner:
+    """增量扫描流式文本，找出第一个完整且符合要求的 JSON 对象
+
+    逐块 `feed()` 模型输出，按括号深度切出顶层 `{...}`，对象内部会跳过字符串里的括号和转义字符，
+    因此嵌套对象、含空格的标签都能正确解析。对象外的自然语言（思考过程）中的引号不影响扫描。
+    找到的对象需包含 `required_keys` 中的全部键（或通过 `validator`），否则继续扫描。
+
+    思考过程中多出一个未闭合的 `{` 时，真正的结果会被当成它内部的嵌套对象：有 `required_keys`/`validator` 时，
+    每闭合一层嵌套都会尝试解析这一层；候选文本超过 `max_buffer` 个字符仍未闭合时，从下一个 `{` 重新扫描。
+    """
+
+    def __init__(
+        self,
+        required_keys: Iterable[str] = (),
+        validator: Union[Callable[[Any], bool], None] = None,
+        max_buffer: int = 16384,
+    ):
+        self.required_keys = tuple(required_keys)
+        self.validator = validator
+        self.max_buffer = max_buffer
+        self.result = None
+
+        self._buffer = ""     # 当前候选对象从 `{` 开始的文本
+        self._reset()
+
+    def _reset(self) -> None:
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._opens: List[int] = []   # 尚未闭合的 `{` 在候选文本中的位置
+
+    @property
+    def done(self) -> bool:
+        return self.result is not None
+
+    def _accept(self, data: Any) -> bool:
+        if not isinstance(data, dict) or any(key not in data for key in self.required_keys):
+            return False
+        return self.validator is None or self.validator(data)
+
+    def _try_parse(self, candidate: str) -> bool:
+        try:
+            data = json.loads(candidate)
+        except json.JSONDecodeError:
+            return False
+        if self._accept(data):
+            self.result = data
+            return True
+        return False
+
+    def feed(self, chunk: str) -> Union[dict, None]:
+        """输入一段文本，找到符合要求的对象后返回它（之后的输入会被忽略），否则返回 None"""
+        if self.result is not None:
+            return self.result
+        pending = chunk
+        while pending:
+            if self._depth == 0:
+                start = pending.find("{")
+                if start < 0:
+                    return None
+                pending = pending[start:]
+                self._buffer = ""
+
+            end = self._scan(pending)
+            if self.result is not None:
+                return self.result
+            if end < 0:
+                self._buffer += pending
+                if len(self._buffer) <= self.max_buffer:
+                    return None
+                # 候选文本过长仍未闭合，多半是思考过程里落单的 `{`，从下一个 `{` 重新扫描
+                pending, self._buffer = self._buffer[1:], ""
+                self._reset()
+                continue
+
+            candidate = self._buffer + pending[:end + 1]
+            pending = pending[end + 1:]
+            if self._try_parse(candidate):
+                return self.result
+            if candidate[1:].find("{") >= 0:
+                # 不是合法 JSON（如思考过程中的花括号），从下一个 `{` 重新扫描，以免漏掉其中嵌套的对象
+                pending = candidate[1:] + pending
+        return None
+
+    def finish(self) -> Union[dict, None]:
+        """输入结束时调用：若有未闭合的 `{`（如思考过程中多出的括号），从它之后重新扫描剩余文本"""
+        while self.result is None and self._depth > 0:
+            remaining = self._buffer[1:]
+            self._buffer = ""
+            self._reset()
+            self.feed(remaining)
+        return self.result
+
+    def _scan(self, text: str) -> int:
+        """更新括号深度和字符串状态，返回当前对象结束的 `}` 位置，未结束时返回 -1
+
+        闭合一层嵌套对象时，若设置了 `required_keys`/`validator`，尝试把这一层当作结果解析，成功则写入 `result` 并返回 -1。
+        """
+        depth, in_string, escape, opens = self._depth, self._in_string, self._escape, self._opens
+        base = len(self._buffer)
+        check_nested = bool(self.required_keys) or self.validator is not None
+        for i, char in enumerate(text):
+            if in_string:
+                if escape:
+                    escape = False
+                elif char == "\\":
+                    escape = True
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char == "{":
+                depth += 1
+                opens.append(base + i)
+            elif char == "}":
+                depth -= 1
+                start = opens.pop() if opens else 0
+                if depth == 0:
+                    self._reset()
+                    return i
+                if check_nested and self._try_parse((self._buffer + text[:i + 1])[start:]):
+                    return -1
+        self._depth, self._in_string, self._escape = depth, in_string, escape
+        return -1
+
+
+def extract_first_json(text: str, required_keys: Iterable[str] = ()) -> Union[dict, None]:
+    """从完整文本中提取第一个包含 `required_keys` 的 JSON 对象"""
+    scanner = JSONStreamScanner(required_keys)
+    scanner.feed(text)
+    return scanner.finish()
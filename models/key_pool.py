@@ -0,0 +1,140 @@
+import os
+import time
+import threading
+from itertools import product
+from typing import Iterable, List, Tuple, Union
+
+import httpx
+
+from models.retry import parse_duration, parse_retry_after
+
+
+# 连续出现这些状态码达到阈值后，暂时隔离该 key
+QUARANTINE_STATUS_CODES = {401, 429}
+
+
+class Endpoint:
+    """一个 (api_key, base_url) 组合及其运行状态"""
+
+    __slots__ = (
+        "api_key", "base_url", "outstanding", "remaining_requests", "remaining_tokens",
+        "exhausted_until", "quarantined_until", "consecutive_failures",
+    )
+
+    def __init__(self, api_key: str, base_url: str):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.outstanding = 0                 # 在途请求数
+        self.remaining_requests = None       # 最近一次响应头中的剩余请求配额
+        self.remaining_tokens = None
+        self.exhausted_until = 0.0           # 配额耗尽，预计重置的时间点
+        self.quarantined_until = 0.0         # 连续 401/429 后的隔离截止时间
+        self.consecutive_failures = 0
+
+    def available_at(self) -> float:
+        return max(self.exhausted_until, self.quarantined_until)
+
+    def __repr__(self) -> str:
+        return f"Endpoint(key=...{self.api_key[-4:]}, base_url={self.base_url}, outstanding={self.outstanding})"
+
+
+class KeyPool:
+    """多个 API key / base_url 之间的负载均衡
+
+    - 选择在途请求最少的可用 endpoint，剩余配额多的优先
+    - 根据响应头 `x-ratelimit-remaining-*` / `x-ratelimit-reset-*` 记录每个 key 的配额
+    - 某个 key 连续返回 401/429 达到 `failure_threshold` 次后隔离 `quarantine_seconds` 秒
+    """
+
+    def __init__(
+        self,
+        api_keys: Iterable[str],
+        base_urls: Union[Iterable[str], None] = None,
+        quarantine_seconds: float = 60.0,
+        failure_threshold: int = 2,
+    ):
+        api_keys = [key for key in api_keys if key]
+        base_urls = [url for url in (base_urls or ["https://api.groq.com"]) if url]
+        if not api_keys:
+            raise ValueError("❌ API Key 未设置")
+
+        self.endpoints: List[Endpoint] = [Endpoint(key, url) for key, url in product(api_keys, base_urls)]
+        self.quarantine_seconds = quarantine_seconds
+        self.failure_threshold = failure_threshold
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, **kwargs) -> "KeyPool":
+        """从 `GROQ_API_KEYS`（逗号分隔，缺省时用 `GROQ_API_KEY`）和 `GROQ_BASE_URLS` 构造"""
+        keys = os.getenv("GROQ_API_KEYS") or os.getenv("GROQ_API_KEY") or ""
+        urls = os.getenv("GROQ_BASE_URLS")
+        return cls(
+            [key.strip() for key in keys.split(",")],
+            [url.strip() for url in urls.split(",")] if urls else None,
+            **kwargs,
+        )
+
+    def __len__(self) -> int:
+        return len(self.endpoints)
+
+    def _rank(self, endpoint: Endpoint) -> Tuple[int, float]:
+        remaining = endpoint.remaining_requests
+        return endpoint.outstanding, -(remaining if remaining is not None else float("inf"))
+
+    def acquire(self, exclude: Union[Endpoint, None] = None, healthy_only: bool = False) -> Union[Endpoint, None]:
+        """选出一个 endpoint 并计入在途请求；全部不可用时选最早恢复的那个
+
+        `exclude` 不参与首选（如刚返回 429 的 key）；`healthy_only=True` 时没有其他立即可用的 endpoint 就返回 None。
+        """
+        now = time.time()
+        with self._lock:
+            healthy = [ep for ep in self.endpoints if ep is not exclude and ep.available_at() <= now]
+            if healthy:
+                endpoint = min(healthy, key=self._rank)
+            elif healthy_only:
+                return None
+            else:
+                endpoint = min(self.endpoints, key=Endpoint.available_at)
+            endpoint.outstanding += 1
+            return endpoint
+
+    def release(self, endpoint: Endpoint) -> None:
+        """请求（或流）结束后归还在途计数"""
+        with self._lock:
+            endpoint.outstanding = max(0, endpoint.outstanding - 1)
+
+    def has_available(self, exclude: Union[Endpoint, None] = None) -> bool:
+        """除 `exclude` 外是否还有立即可用的 endpoint"""
+        now = time.time()
+        with self._lock:
+            return any(ep is not exclude and ep.available_at() <= now for ep in self.endpoints)
+
+    def record(self, endpoint: Endpoint, response: httpx.Response) -> None:
+        """根据响应头/状态码更新 endpoint 的配额和健康状态（传输层错误不代表 key 有问题，不在这里记录）"""
+        now = time.time()
+        headers = response.headers
+        with self._lock:
+            for kind in ("requests", "tokens"):
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                if remaining is None:
+                    continue
+                try:
+                    remaining = float(remaining)
+                except ValueError:
+                    continue
+                setattr(endpoint, f"remaining_{kind}", remaining)
+                reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}", ""))
+                if remaining <= 0 and reset:
+                    endpoint.exhausted_until = max(endpoint.exhausted_until, now + reset)
+
+            if response.status_code in QUARANTINE_STATUS_CODES:
+                endpoint.consecutive_failures += 1
+                if response.status_code == 429:
+                    retry_after = parse_retry_after(headers)
+                    if retry_after:
+                        endpoint.exhausted_until = max(endpoint.exhausted_until, now + retry_after)
+                if endpoint.consecutive_failures >= self.failure_threshold:
+                    endpoint.quarantined_until = now + self.quarantine_seconds
+                    print(f"⚠️ {endpoint} 连续返回 {response.status_code}，隔离 {self.quarantine_seconds}s")
+            elif not response.is_error:
+                endpoint.consecutive_failures = 0
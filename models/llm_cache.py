@@ -0,0 +1,136 @@
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Union
+
+
+def cache_key(**params: Any) -> str:
+    """对请求参数（model、messages、tools、temperature 等）做规范化序列化后取哈希"""
+    canonical = json.dumps(params, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """LLM 响应的精确匹配缓存：内存 LRU + TTL，可选的 SQLite 持久层（多进程共享）
+
+    默认只缓存确定性的请求（temperature <= 0），`allow_nondeterministic=True`
+    或单次调用显式要求时才缓存采样结果。
+    条目以 JSON 文本保存，每次命中重新解码，调用方拿到的是各自独立的对象，修改它不会影响缓存。
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: Union[float, None] = 3600.0,
+        db_path: Union[str, None] = None,
+        allow_nondeterministic: bool = False,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        self.allow_nondeterministic = allow_nondeterministic
+
+        self._entries = OrderedDict()  # key -> (过期时间, 响应的 JSON 文本)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+        if db_path:
+            self._connect().execute(
+                "CREATE TABLE IF NOT EXISTS llm_response_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def should_cache(self, temperature: Union[float, None], opt_in: Union[bool, None] = None) -> bool:
+        """判断本次请求是否走缓存：显式 opt_in 优先，否则只缓存 temperature <= 0 的请求"""
+        if opt_in is not None:
+            use_cache = opt_in
+        else:
+            use_cache = self.allow_nondeterministic or not temperature
+        if not use_cache:
+            with self._lock:
+                self.bypassed += 1
+        return use_cache
+
+    def get(self, key: str) -> Union[Any, None]:
+        now = time.time()
+        text = None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, text = entry
+                if expires is None or expires > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                else:
+                    del self._entries[key]
+                    text = None
+        if text is not None:
+            return json.loads(text)
+
+        if self.db_path:
+            row = self._connect().execute(
+                "SELECT value, expires FROM llm_response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row and (row[1] is None or row[1] > now):
+                with self._lock:
+                    self._store(key, row[1], row[0])
+                    self.hits += 1
+                    self.disk_hits += 1
+                return json.loads(row[0])
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, value: Any) -> None:
+        expires = time.time() + self.ttl if self.ttl else None
+        text = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._store(key, expires, text)
+        if self.db_path:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO llm_response_cache (key, value, expires) VALUES (?, ?, ?)",
+                (key, text, expires),
+            )
+
+    def _store(self, key: str, expires: Union[float, None], text: str) -> None:
+        self._entries[key] = (expires, text)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self.db_path:
+            self._connect().execute("DELETE FROM llm_response_cache")
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": round(self.hit_rate, 4),
+            "entries": len(self._entries),
+        }
@@ -0,0 +1,201 @@
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, List, Union
+
+import numpy as np
+
+
+# provider(*args, cancel=threading.Event, **kwargs) -> 结果；返回 None 或抛异常视为失败
+Provider = Callable[..., object]
+
+
+class ProviderStats:
+    """单个 provider 的延迟/错误画像和熔断状态"""
+
+    __slots__ = (
+        "name", "ewma_latency", "error_rate", "latencies", "consecutive_failures",
+        "open_until", "probing", "outstanding",
+    )
+
+    def __init__(self, name: str, window: int = 50):
+        self.name = name
+        self.ewma_latency = None             # 成功请求耗时的指数移动平均（秒）
+        self.error_rate = 0.0                # 失败率的指数移动平均
+        self.latencies = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.open_until = 0.0                # 熔断打开的截止时间
+        self.probing = False                 # 半开状态下是否已有试探请求在途
+        self.outstanding = 0
+
+    def p95(self) -> Union[float, None]:
+        return float(np.percentile(self.latencies, 95)) if self.latencies else None
+
+    def __repr__(self) -> str:
+        ewma = f"{self.ewma_latency:.2f}s" if self.ewma_latency is not None else "-"
+        p95 = self.p95()
+        return (f"{self.name}(ewma={ewma}, p95={f'{p95:.2f}s' if p95 is not None else '-'}, "
+                f"errors={self.error_rate:.0%}, open={self.open_until > time.monotonic()})")
+
+
+class LLMRouter:
+    """在多个可互换的 LLM provider 之间路由同一个请求
+
+    - 按 EWMA 延迟 / (1 - 错误率) 选择最快的健康 provider
+    - `hedge=True` 时，主请求超过其 p95 延迟仍未返回，就向次优 provider 发一份对冲请求，
+      取先成功的结果，并通过 `cancel` 事件通知另一方停止（流式调用在下一个 chunk 处关闭连接）
+    - 连续失败 `failure_threshold` 次后熔断 `cooldown` 秒，之后放行一个试探请求，成功即恢复
+    """
+
+    def __init__(
+        self,
+        providers: Dict[str, Provider],
+        alpha: float = 0.2,
+        window: int = 50,
+        failure_threshold: int = 3,
+        cooldown: float = 30.0,
+        default_latency: float = 5.0,
+        min_hedge_delay: float = 0.5,
+        min_samples: int = 5,
+    ):
+        if not providers:
+            raise ValueError("❌ 至少需要一个 provider")
+        self.providers = dict(providers)
+        self.stats = {name: ProviderStats(name, window) for name in self.providers}
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.default_latency = default_latency    # 还没有样本时假定的延迟，也是样本不足时的对冲等待时间
+        self.min_hedge_delay = min_hedge_delay
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2 * len(self.providers) + 2, thread_name_prefix="llm-router")
+
+    # ---- 统计 ----
+
+    def _score(self, stats: ProviderStats) -> float:
+        latency = stats.ewma_latency if stats.ewma_latency is not None else self.default_latency
+        return latency / max(0.05, 1.0 - stats.error_rate)
+
+    def _available(self, stats: ProviderStats, now: float) -> bool:
+        if stats.open_until <= 0:
+            return True
+        # 熔断期过后进入半开状态，同一时间只放行一个试探请求
+        return stats.open_until <= now and not stats.probing
+
+    def ranked(self, exclude: tuple = ()) -> List[str]:
+        """当前可用的 provider，按预期耗时从快到慢排序"""
+        now = time.monotonic()
+        with self._lock:
+            candidates = [s for name, s in self.stats.items() if name not in exclude and self._available(s, now)]
+            return [s.name for s in sorted(candidates, key=self._score)]
+
+    def _start(self, name: str) -> None:
+        with self._lock:
+            stats = self.stats[name]
+            stats.outstanding += 1
+            if stats.open_until > 0:
+                stats.probing = True
+
+    def _record(self, name: str, elapsed: float, ok: Union[bool, None]) -> None:
+        """记录一次调用结果；`ok=None` 表示被取消，耗时只是下限，只计入延迟"""
+        with self._lock:
+            stats = self.stats[name]
+            stats.outstanding -= 1
+            stats.probing = False
+            if ok is not False:
+                stats.latencies.append(elapsed)
+                stats.ewma_latency = elapsed if stats.ewma_latency is None else (
+                    self.alpha * elapsed + (1 - self.alpha) * stats.ewma_latency)
+            if ok is None:
+                return
+            stats.error_rate = (1 - self.alpha) * stats.error_rate + self.alpha * (0.0 if ok else 1.0)
+            if ok:
+                stats.consecutive_failures = 0
+                stats.open_until = 0.0
+                return
+            stats.consecutive_failures += 1
+            if stats.open_until > 0 or stats.consecutive_failures >= self.failure_threshold:
+                stats.open_until = time.monotonic() + self.cooldown
+                print(f"⚠️ {name} 连续失败 {stats.consecutive_failures} 次，熔断 {self.cooldown}s")
+
+    def hedge_delay(self, name: str) -> float:
+        """对冲前的等待时间：样本足够时取该 provider 的 p95 延迟"""
+        with self._lock:
+            stats = self.stats[name]
+            delay = stats.p95() if len(stats.latencies) >= self.min_samples else self.default_latency
+        return max(self.min_hedge_delay, delay)
+
+    # ---- 调用 ----
+
+    def _call(self, name: str, cancel: threading.Event, args, kwargs):
+        self._start(name)
+        started = time.monotonic()
+        try:
+            result = self.providers[name](*args, cancel=cancel, **kwargs)
+        except Exception as e:
+            if cancel.is_set():
+                self._record(name, time.monotonic() - started, None)
+            else:
+                print(f"❌ {name} 调用失败: {e}")
+                self._record(name, time.monotonic() - started, False)
+            raise
+        elapsed = time.monotonic() - started
+        if cancel.is_set() and result is None:
+            self._record(name, elapsed, None)
+        else:
+            self._record(name, elapsed, result is not None)
+        return result
+
+    def route(self, *args, hedge: bool = False, **kwargs):
+        """把请求发给最快的健康 provider，失败时依次换下一个；返回第一个非 None 的结果，全部失败返回 None"""
+        tried = ()
+        while True:
+            ranked = self.ranked(exclude=tried)
+            if not ranked:
+                return None
+            if hedge and len(ranked) > 1:
+                result, used = self._hedged(ranked[0], ranked[1], args, kwargs)
+            else:
+                used = (ranked[0],)
+                try:
+                    result = self._call(ranked[0], threading.Event(), args, kwargs)
+                except Exception:
+                    result = None
+            if result is not None:
+                return result
+            tried += used
+
+    def _hedged(self, primary: str, backup: str, args, kwargs):
+        """主请求超过 p95 延迟未返回时再向 `backup` 发一份，返回 (先成功的结果, 用过的 provider)"""
+        cancels = {primary: threading.Event(), backup: threading.Event()}
+        futures = {self._executor.submit(self._call, primary, cancels[primary], args, kwargs): primary}
+        done, _ = wait(futures, timeout=self.hedge_delay(primary))
+        if not done:
+            print(f"⏱️ {primary} 超过 p95 仍未返回，向 {backup} 发送对冲请求")
+            futures[self._executor.submit(self._call, backup, cancels[backup], args, kwargs)] = backup
+
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception:
+                    continue
+                if result is not None:
+                    winner = futures[future]
+                    for name, event in cancels.items():
+                        if name != winner:
+                            event.set()
+                    print(f"✅ {winner} 先返回结果")
+                    return result, tuple(futures.values())
+        return None, tuple(futures.values())
+
+    def summary(self) -> List[ProviderStats]:
+        with self._lock:
+            return list(self.stats.values())
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,177 @@
+import json
+import time
+import threading
+from typing import Iterable, Iterator, List, Union
+
+import requests
+
+from config.config import OLLAMA_HOST, OLLAMA_KEEP_ALIVE, OLLAMA_WARM_MODELS, OLLAMA_HEARTBEAT_SECONDS
+
+
+def _ms(nanoseconds: Union[int, None]) -> Union[float, None]:
+    return round(nanoseconds / 1e6, 1) if nanoseconds else None
+
+
+class OllamaTiming:
+    """一次 Ollama 调用的耗时拆分：模型加载与生成分开统计（服务端数据缺失时为 None）"""
+
+    __slots__ = ("model", "load_ms", "prompt_eval_ms", "eval_ms", "total_ms", "first_token_ms")
+
+    def __init__(self, model: str, data: Union[dict, None] = None, first_token_ms: Union[float, None] = None):
+        data = data or {}
+        self.model = model
+        self.load_ms = _ms(data.get("load_duration"))
+        self.prompt_eval_ms = _ms(data.get("prompt_eval_duration"))
+        self.eval_ms = _ms(data.get("eval_duration"))
+        self.total_ms = _ms(data.get("total_duration"))
+        self.first_token_ms = first_token_ms
+
+    def __repr__(self) -> str:
+        parts = [f"加载 {self.load_ms}ms" if self.load_ms is not None else None,
+                 f"提示词 {self.prompt_eval_ms}ms" if self.prompt_eval_ms is not None else None,
+                 f"生成 {self.eval_ms}ms" if self.eval_ms is not None else None,
+                 f"首 token {self.first_token_ms}ms" if self.first_token_ms is not None else None]
+        return f"{self.model}: " + "，".join(p for p in parts if p)
+
+
+class OllamaClient:
+    """共享的 Ollama 客户端：复用连接池，调用时固定 `keep_alive`，支持预热和后台心跳保持模型常驻显存"""
+
+    def __init__(self, host: str = OLLAMA_HOST, keep_alive: Union[str, int] = OLLAMA_KEEP_ALIVE, timeout: float = 300):
+        self.host = host.rstrip("/")
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.last_timing: Union[OllamaTiming, None] = None
+
+        self._chat_client = None
+        self._heartbeat = None
+        self._stop = threading.Event()
+
+    # ---- 原生 REST 接口 ----
+
+    def generate_stream(self, model: str, prompt: str, **options) -> Iterator[str]:
+        """流式调用 /api/generate，逐块产出文本；调用方提前停止迭代时会关闭连接，Ollama 随即停止生成"""
+        payload = {"model": model, "prompt": prompt, "stream": True, "keep_alive": self.keep_alive}
+        if options:
+            payload["options"] = options
+        started = time.perf_counter()
+        first_token_ms = None
+        response = self.session.post(f"{self.host}/api/generate", json=payload, stream=True, timeout=self.timeout)
+        try:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                if data.get("done"):
+                    self.last_timing = OllamaTiming(model, data, first_token_ms)
+                    print(f"\n⏱️ {self.last_timing}")
+                    break
+                text = data.get("response", "")
+                if text and first_token_ms is None:
+                    first_token_ms = round((time.perf_counter() - started) * 1000, 1)
+                    # 提前停止时拿不到服务端统计，先记录首 token 延迟（含模型加载）
+                    self.last_timing = OllamaTiming(model, None, first_token_ms)
+                yield text
+        finally:
+            response.close()
+
+    def loaded_models(self) -> List[dict]:
+        """当前驻留在内存/显存中的模型（/api/ps）"""
+        response = self.session.get(f"{self.host}/api/ps", timeout=10)
+        response.raise_for_status()
+        return response.json().get("models", [])
+
+    def _load(self, model: str) -> OllamaTiming:
+        """不带 prompt 的 /api/generate 只加载模型并刷新 keep_alive 计时"""
+        response = self.session.post(
+            f"{self.host}/api/generate",
+            json={"model": model, "keep_alive": self.keep_alive, "stream": False},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return OllamaTiming(model, response.json())
+
+    def warm_up(self, models: Iterable[str] = OLLAMA_WARM_MODELS) -> List[OllamaTiming]:
+        """预加载模型，返回各模型的加载耗时"""
+        timings = []
+        for model in models:
+            try:
+                timing = self._load(model)
+            except requests.RequestException as e:
+                print(f"⚠️ 预热 {model} 失败: {e}")
+                continue
+            timings.append(timing)
+            print(f"🔥 已预热 {timing}")
+        return timings
+
+    def start_heartbeat(self, models: Iterable[str] = OLLAMA_WARM_MODELS, interval: float = OLLAMA_HEARTBEAT_SECONDS) -> None:
+        """后台线程定期给仍驻留的模型发空请求刷新 keep_alive
+
+        只刷新 /api/ps 报告为常驻的模型：显存放不下全部模型时，重新加载已被换出的模型会把正在用的挤出去。
+        """
+        if self._heartbeat is not None and self._heartbeat.is_alive():
+            return
+        models = list(models)
+        self._stop.clear()
+
+        def beat():
+            while not self._stop.wait(interval):
+                try:
+                    resident = {m.get("model") or m.get("name") for m in self.loaded_models()}
+                except requests.RequestException:
+                    continue
+                cold = [model for model in models if model not in resident]
+                if cold:
+                    print(f"💤 模型已被卸载，下次调用时再加载: {cold}")
+                for model in models:
+                    if model not in resident:
+                        continue
+                    try:
+                        self._load(model)
+                    except requests.RequestException as e:
+                        print(f"⚠️ 刷新 {model} 的 keep_alive 失败: {e}")
+
+        self._heartbeat = threading.Thread(target=beat, name="ollama-heartbeat", daemon=True)
+        self._heartbeat.start()
+
+    def stop_heartbeat(self) -> None:
+        self._stop.set()
+
+    # ---- ollama Python 库 ----
+
+    def chat(self, model: str, messages: list, **kwargs):
+        """通过 ollama 库的 `Client.chat` 调用（返回 ChatResponse），自动带上 `keep_alive` 并记录耗时"""
+        if self._chat_client is None:
+            import ollama
+
+            self._chat_client = ollama.Client(host=self.host)
+        kwargs.setdefault("keep_alive", self.keep_alive)
+        response = self._chat_client.chat(model=model, messages=messages, **kwargs)
+        if not kwargs.get("stream"):
+            self.last_timing = OllamaTiming(model, {
+                "load_duration": getattr(response, "load_duration", None),
+                "prompt_eval_duration": getattr(response, "prompt_eval_duration", None),
+                "eval_duration": getattr(response, "eval_duration", None),
+                "total_duration": getattr(response, "total_duration", None),
+            })
+            print(f"⏱️ {self.last_timing}")
+        return response
+
+    def close(self) -> None:
+        self.stop_heartbeat()
+        self.session.close()
+
+
+_default_client = None
+_default_lock = threading.Lock()
+
+
+def get_ollama_client() -> OllamaClient:
+    """进程内共享的 Ollama 客户端"""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = OllamaClient()
+        return _default_client
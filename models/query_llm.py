@@ -1,18 +1,34 @@
 import json
-import re
 import os
 import requests
-from prompt_manager import get_operation_prompt
+from prompt_manager import get_operation_prompt, get_plan_prompt
 from openai import OpenAI
+from config.config import (
+    GROUNDING_PROVIDERS, GROUNDING_HEDGE, GROQ_GROUNDING_MODEL,
+    RATE_LIMIT_DB_PATH, GROQ_REQUESTS_PER_MINUTE, GROQ_TOKENS_PER_MINUTE,
+)
+from models.json_stream import JSONStreamScanner, extract_first_json
+from models.ollama_client import get_ollama_client
+from models.llm_router import LLMRouter
+from models.rate_limiter import shared_rate_limiter
 
 
 DeepSeek_API_KEY = os.getenv('DeepSeek_API_KEY')
 client = OpenAI(api_key=DeepSeek_API_KEY, base_url="https://api.deepseek.com/v1")
 
-def query_deepseek(user_input, parsed_content, stream=True):
-    """调用 deepseek-r1 让 AI 识别用户输入并找出目标（流式输出）"""
-    prompt = get_operation_prompt(user_input, parsed_content)
+# 单步目标推理结果必须包含的字段
+TARGET_KEYS = ('target', 'action', 'bbox')
+
+# 操作计划中 execute_ui_plan 支持的动作
+PLAN_ACTIONS = ('click', 'double_click', 'type', 'hotkey', 'wait_for_change')
+
 
+def chat_deepseek(prompt, stream=True, scanner=None, cancel=None, echo=True):
+    """调用 deepseek，返回回复文本（`echo` 为 True 时实时打印）
+
+    传入 `scanner`（`JSONStreamScanner`）时边接收边扫描，拿到完整的 JSON 结果后立即关闭流，不再为后续 token 付费。
+    `cancel`（`threading.Event`）被设置时同样关闭流，用于对冲请求中输掉的一方。
+    """
     if stream:
         # 流式输出
         response = client.chat.completions.create(
@@ -25,11 +41,22 @@ def query_deepseek(user_input, parsed_content, stream=True):
         )
         responses = []
         for chunk in response:
+            if cancel is not None and cancel.is_set():
+                response.close()
+                break
             content = chunk.choices[0].delta.content
             if content:  # 确保 content 不为空
                 responses.append(content)
-                print(content, end='', flush=True)  # 实时打印，确保立即刷新输出缓冲区
-        processed_text = ''.join(responses).replace(' ', '')
+                if echo:
+                    print(content, end='', flush=True)  # 实时打印，确保立即刷新输出缓冲区
+                if scanner is not None and scanner.feed(content) is not None:
+                    response.close()
+                    if echo:
+                        print("\n已拿到完整的 JSON 结果，提前结束流式输出")
+                    break
+        if scanner is not None:
+            scanner.finish()
+        return ''.join(responses)
     else:
         # 非流式输出
         response = client.chat.completions.create(
@@ -40,73 +67,129 @@ def query_deepseek(user_input, parsed_content, stream=True):
             ],
             stream=False,
         )
-        processed_text = response.choices[0].message.content.replace(' ', '')
-        print(processed_text)
+        text = response.choices[0].message.content
+        if echo:
+            print(text)
+        if scanner is not None:
+            scanner.feed(text)
+            scanner.finish()
+        return text
 
-        # 提取 JSON 数据
-    structured_data = extract_json(processed_text)
-    return structured_data
 
+def query_deepseek(user_input, parsed_content, stream=True, cancel=None, echo=True):
+    """调用 deepseek-r1 让 AI 识别用户输入并找出目标（流式输出，拿到结果即停止）"""
+    prompt = get_operation_prompt(user_input, parsed_content)
+    scanner = JSONStreamScanner(TARGET_KEYS)
+    chat_deepseek(prompt, stream, scanner, cancel, echo)
+    return scanner.result
 
 
-def query_ollama(user_input, parsed_content):
-    """调用 deepseek-r1 让 AI 识别用户输入并找出目标（流式输出）"""
+def _is_valid_plan(data):
+    steps = data['steps']
+    return isinstance(steps, list) and all(
+        isinstance(step, dict) and step.get('action') in PLAN_ACTIONS for step in steps
+    )
+
+
+def query_deepseek_plan(user_input, parsed_content, stream=True):
+    """调用 deepseek-r1 把复合指令拆成多步操作计划，返回步骤列表（失败时为空列表）
+
+    每一步都必须是包含已知 `action` 的对象，否则整个计划作废：跳过其中一步可能让后续动作作用在错误的界面上。
+    """
+    prompt = get_plan_prompt(user_input, parsed_content)
+    scanner = JSONStreamScanner(('steps',), validator=_is_valid_plan)
+    chat_deepseek(prompt, stream, scanner)
+    return scanner.result['steps'] if scanner.result else []
+
+
+def query_ollama(user_input, parsed_content, model="deepseek-r1:14b", cancel=None, echo=True):
+    """调用本地 deepseek-r1 让 AI 识别用户输入并找出目标（流式输出，拿到结果即停止）"""
     prompt = get_operation_prompt(user_input, parsed_content)
+    scanner = JSONStreamScanner(TARGET_KEYS)
 
-    url = "http://localhost:11434/api/generate"
-    headers = {"Content-Type": "application/json"}
-    payload = {"model": "deepseek-r1:14b", "prompt": prompt, "stream": True}
+    chunks = get_ollama_client().generate_stream(model, prompt)
+    try:
+        for text in chunks:
+            if cancel is not None and cancel.is_set():
+                break
+            # 实时输出每一部分的内容
+            if echo:
+                print(text, end='', flush=True)
+            if scanner.feed(text) is not None:
+                if echo:
+                    print("\n已拿到完整的 JSON 结果，提前结束流式输出")
+                break
+    except requests.RequestException as e:
+        print(f"请求失败: {e}")
+    finally:
+        # 关闭连接，Ollama 随即停止生成
+        chunks.close()
 
-    # 发起请求并启用流式传输
-    response = requests.post(url, headers=headers, json=payload, stream=True)
+    return scanner.finish()
 
-    responses = []
 
-    if response.status_code == 200:
-        # 逐行读取响应数据，实时打印并保存
-        for line in response.iter_lines():
-            if line:
-                try:
-                    # 解析每一行的响应
-                    response_data = json.loads(line)
-                    # 提取 'response' 字段并保存
-                    response_field = response_data.get("response", "")
-                    responses.append(response_field)
+_groq_client = None
 
-                    # 实时输出每一部分的内容
-                    print(response_field, end='', flush=True)
 
-                except json.JSONDecodeError:
-                    print("JSON解析错误")
-    else:
-        print(f"请求失败，错误码: {response.status_code}")
+def _get_groq_client():
+    """按需创建 Groq 客户端（未配置 GROQ_API_KEY 时抛出 ValueError），与 agent 共享 RPM/TPM 配额"""
+    global _groq_client
+    if _groq_client is None:
+        from models.groq_mock import Groq
+
+        rate_limiter = shared_rate_limiter("groq", GROQ_REQUESTS_PER_MINUTE, GROQ_TOKENS_PER_MINUTE, RATE_LIMIT_DB_PATH)
+        _groq_client = Groq(timeout=60, rate_limiter=rate_limiter)
+    return _groq_client
+
+
+def query_groq(user_input, parsed_content, model=GROQ_GROUNDING_MODEL, cancel=None, echo=True):
+    """通过 Groq 让 AI 识别用户输入并找出目标（流式输出，拿到结果即停止）"""
+    prompt = get_operation_prompt(user_input, parsed_content)
+    scanner = JSONStreamScanner(TARGET_KEYS)
+
+    with _get_groq_client().chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        stream=True,
+    ) as response:
+        for chunk in response:
+            if cancel is not None and cancel.is_set():
+                break
+            content = chunk.choices[0].delta.content if chunk.choices else None
+            if not content:
+                continue
+            if echo:
+                print(content, end='', flush=True)
+            if scanner.feed(content) is not None:
+                if echo:
+                    print("\n已拿到完整的 JSON 结果，提前结束流式输出")
+                break
+
+    return scanner.finish()
+
 
-    # 将所有响应的文本拼接成一个字符串
-    processed_text = ''.join(responses)
+# 可互换的目标识别 provider；对冲时两路同时输出会交错，因此不实时打印
+GROUNDING_PROVIDER_FUNCTIONS = {
+    'deepseek': lambda user_input, parsed_content, cancel: query_deepseek(user_input, parsed_content, cancel=cancel, echo=False),
+    'ollama': lambda user_input, parsed_content, cancel: query_ollama(user_input, parsed_content, cancel=cancel, echo=False),
+    'groq': lambda user_input, parsed_content, cancel: query_groq(user_input, parsed_content, cancel=cancel, echo=False),
+}
 
-    # 移除多余的空格、换行符等
-    processed_text = processed_text.replace(' ', '')
+grounding_router = LLMRouter({name: GROUNDING_PROVIDER_FUNCTIONS[name] for name in GROUNDING_PROVIDERS})
 
-    # 通过提取的文本返回目标的结构化数据
-    structured_data = extract_json(processed_text)
 
-    return structured_data
+def query_target(user_input, parsed_content, hedge=GROUNDING_HEDGE):
+    """经路由器选择最快的健康 provider 识别目标；`hedge` 为 True 时主请求慢于其 p95 会向次优 provider 发对冲请求"""
+    target_data = grounding_router.route(user_input, parsed_content, hedge=hedge)
+    print(f"路由统计: {grounding_router.summary()}")
+    return target_data
 
 
-def extract_json(model_result):
+def extract_json(model_result, required_keys=()):
     """
-    从模型返回的文本中提取结构化的JSON数据。
+    从模型返回的文本中提取第一个完整的（可嵌套的）JSON 对象，可要求包含 `required_keys` 中的字段。
     """
-    # 使用正则表达式提取 JSON 格式的数据
-    match = re.search(r'\{.*?}', model_result, re.DOTALL)
-    if match:
-        try:
-            # 输出匹配到的部分
-            print("Matched JSON string:", match.group(0))
-            # 尝试将提取的字符串解析为 JSON 数据
-            json_data = json.loads(match.group(0))
-            return json_data
-        except json.JSONDecodeError:
-            print("Error parsing JSON.")
-            return None
-    return None
\ No newline at end of file
+    json_data = extract_first_json(model_result, required_keys)
+    if json_data is not None:
+        print("Matched JSON:", json_data)
+    return json_data
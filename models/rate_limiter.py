@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+from typing import Any, Iterable, List, Tuple, Union
+
+
+# 没有指定 max_tokens 时，按这个数估算一次补全的输出 token
+DEFAULT_COMPLETION_TOKENS = 512
+
+
+def estimate_text_tokens(text: str) -> int:
+    """粗略估算 token 数：非 ASCII（中文等）按 1 字 1 token，ASCII 按 4 字符 1 token"""
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return non_ascii + (len(text) - non_ascii + 3) // 4
+
+
+def estimate_request_tokens(messages: Iterable[Any], max_tokens: Union[int, None] = None, tools: Union[list, None] = None) -> int:
+    """估算一次 chat 请求消耗的 token（提示词 + 预计输出），兼容 dict 和带 content 属性的消息对象"""
+    total = 0
+    for message in messages:
+        content = message.get("content") if isinstance(message, dict) else getattr(message, "content", message)
+        if content is None:
+            continue
+        total += estimate_text_tokens(content if isinstance(content, str) else json.dumps(content, ensure_ascii=False, default=str))
+        total += 4  # 每条消息的角色等固定开销
+    if tools:
+        total += estimate_text_tokens(json.dumps(tools, ensure_ascii=False))
+    return total + (max_tokens or DEFAULT_COMPLETION_TOKENS)
+
+
+# 每个桶：(key, 容量, 每秒补充速率, 本次消耗)
+Reservation = Tuple[str, float, float, float]
+
+
+def _refill_and_take(tokens: float, updated: float, now: float, capacity: float, rate: float, amount: float) -> float:
+    tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+    return min(capacity, tokens - amount)
+
+
+class InMemoryBucketStore:
+    """进程内令牌桶存储，线程安全"""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, reservations: List[Reservation], max_wait: Union[float, None] = None) -> Union[float, None]:
+        """原子地从多个桶中预扣令牌（允许透支），返回需要等待的秒数；超过 `max_wait` 时不扣并返回 None"""
+        now = time.time()
+        with self._lock:
+            updated = {}
+            wait = 0.0
+            for key, capacity, rate, amount in reservations:
+                tokens, last = self._buckets.get(key, (capacity, now))
+                tokens = _refill_and_take(tokens, last, now, capacity, rate, amount)
+                updated[key] = (tokens, now)
+                if tokens < 0:
+                    wait = max(wait, -tokens / rate)
+            if max_wait is not None and wait > max_wait:
+                return None
+            self._buckets.update(updated)
+            return wait
+
+
+class SQLiteBucketStore:
+    """基于 SQLite 的令牌桶存储，同一台机器上的多个进程（如多个 uvicorn worker）共享配额"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit_buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def reserve(self, reservations: List[Reservation], max_wait: Union[float, None] = None) -> Union[float, None]:
+        """语义同 `InMemoryBucketStore.reserve`，用 BEGIN IMMEDIATE 保证跨进程原子性"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            wait = 0.0
+            rows = []
+            for key, capacity, rate, amount in reservations:
+                row = conn.execute("SELECT tokens, updated FROM rate_limit_buckets WHERE key = ?", (key,)).fetchone()
+                tokens, last = row if row else (capacity, now)
+                tokens = _refill_and_take(tokens, last, now, capacity, rate, amount)
+                rows.append((key, tokens, now))
+                if tokens < 0:
+                    wait = max(wait, -tokens / rate)
+            if max_wait is not None and wait > max_wait:
+                conn.execute("ROLLBACK")
+                return None
+            conn.executemany(
+                "INSERT INTO rate_limit_buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                rows,
+            )
+            conn.execute("COMMIT")
+            return wait
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+class RateLimitExceeded(RuntimeError):
+    """在允许的最长等待时间内拿不到配额"""
+
+
+class RateLimiter:
+    """按每分钟请求数和每分钟 token 数同时限流的令牌桶
+
+    采用预扣（透支）方式：先原子地扣掉本次的请求数和估算 token，再按欠额等待，
+    这样大请求不会饿死，流量被平滑到配额速率上，而不是突发后集体吃 429。
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Union[float, None] = 30,
+        tokens_per_minute: Union[float, None] = 6000,
+        store: Union[InMemoryBucketStore, SQLiteBucketStore, None] = None,
+        name: str = "groq",
+        max_wait: Union[float, None] = 120.0,
+    ):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.store = store or InMemoryBucketStore()
+        self.name = name
+        self.max_wait = max_wait
+
+    def _reservations(self, tokens: float, requests: float = 1) -> List[Reservation]:
+        reservations = []
+        if self.requests_per_minute and requests:
+            reservations.append((f"{self.name}:requests", self.requests_per_minute, self.requests_per_minute / 60, requests))
+        if self.tokens_per_minute and tokens:
+            reservations.append((f"{self.name}:tokens", self.tokens_per_minute, self.tokens_per_minute / 60, tokens))
+        return reservations
+
+    def reserve(self, tokens: float = 0) -> float:
+        """预扣一次请求和 `tokens` 个 token，返回需要等待的秒数"""
+        reservations = self._reservations(tokens)
+        if not reservations:
+            return 0.0
+        wait = self.store.reserve(reservations, self.max_wait)
+        if wait is None:
+            raise RateLimitExceeded(f"❌ {self.name} 限流等待超过 {self.max_wait}s")
+        return wait
+
+    def acquire(self, tokens: float = 0) -> float:
+        """阻塞直到配额可用，返回实际等待的秒数"""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def aacquire(self, tokens: float = 0) -> float:
+        """`acquire` 的异步版本，不阻塞事件循环"""
+        wait = await asyncio.to_thread(self.reserve, tokens) if isinstance(self.store, SQLiteBucketStore) else self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def reconcile(self, estimated_tokens: float, actual_tokens: Union[float, None]) -> None:
+        """拿到真实 usage 后修正 token 桶：估多了退还，估少了补扣"""
+        if not self.tokens_per_minute or actual_tokens is None:
+            return
+        delta = actual_tokens - estimated_tokens
+        if delta:
+            self.store.reserve(self._reservations(delta, requests=0))
+
+
+_shared_limiters = {}
+_shared_lock = threading.Lock()
+
+
+def shared_rate_limiter(
+    name: str = "groq",
+    requests_per_minute: Union[float, None] = None,
+    tokens_per_minute: Union[float, None] = None,
+    db_path: Union[str, None] = None,
+) -> RateLimiter:
+    """获取按名字共享的限流器；配置了 `db_path` 时跨进程共享，否则只在本进程内共享
+
+    未传入的参数从环境变量 `<NAME>_REQUESTS_PER_MINUTE`、`<NAME>_TOKENS_PER_MINUTE`、
+    `RATE_LIMIT_DB_PATH` 读取。
+    """
+    prefix = name.upper()
+    if requests_per_minute is None:
+        requests_per_minute = float(os.getenv(f"{prefix}_REQUESTS_PER_MINUTE", 30))
+    if tokens_per_minute is None:
+        tokens_per_minute = float(os.getenv(f"{prefix}_TOKENS_PER_MINUTE", 6000))
+    db_path = db_path or os.getenv("RATE_LIMIT_DB_PATH")
+
+    with _shared_lock:
+        limiter = _shared_limiters.get(name)
+        if limiter is None:
+            store = SQLiteBucketStore(db_path) if db_path else InMemoryBucketStore()
+            limiter = RateLimiter(requests_per_minute, tokens_per_minute, store=store, name=name)
+            _shared_limiters[name] = limiter
+        return limiter
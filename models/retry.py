@@ -0,0 +1,120 @@
+import random
+import re
+import time
+from email.utils import parsedate_to_datetime
+from typing import Mapping, Union
+
+import httpx
+
+
+# 服务端尚未处理或明确要求重试的状态码，重发不会产生重复副作用
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+# 只重试请求还没发出去的传输错误；读超时等情况下服务端可能已经处理了请求
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+
+def parse_duration(value: str) -> Union[float, None]:
+    """解析 Groq 的重置时间格式（如 `2m59.56s`、`7.66s`、`120ms`、`1.5`），返回秒数"""
+    value = value.strip()
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    parts = _DURATION_PART.findall(value)
+    if not parts or "".join(n + u for n, u in parts) != value:
+        return None
+    units = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+    return sum(float(number) * units[unit] for number, unit in parts)
+
+
+def parse_retry_after(headers: Mapping[str, str]) -> Union[float, None]:
+    """从响应头中读取服务端建议的等待秒数
+
+    优先使用 `retry-after-ms` / `Retry-After`，没有时再看已耗尽配额对应的
+    `x-ratelimit-reset-requests` / `x-ratelimit-reset-tokens`。
+    """
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return max(0.0, float(retry_after_ms) / 1000)
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        seconds = parse_duration(retry_after)
+        if seconds is not None:
+            return seconds
+        try:
+            return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+        except (TypeError, ValueError):
+            pass
+
+    resets = []
+    for kind in ("requests", "tokens"):
+        remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+        reset = headers.get(f"x-ratelimit-reset-{kind}")
+        if reset and remaining is not None and remaining.strip() in ("0", "0.0"):
+            seconds = parse_duration(reset)
+            if seconds is not None:
+                resets.append(seconds)
+    return max(resets) if resets else None
+
+
+def backoff_delay(attempt: int, base_delay: float = 0.5, max_delay: float = 8.0) -> float:
+    """Full jitter 指数退避：在 [0, min(max_delay, base_delay * 2^attempt)] 内均匀取值"""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+class RetryPolicy:
+    """单次调用的重试预算：最多 `max_retries` 次重试，且总耗时不超过 `deadline` 秒"""
+
+    def __init__(
+        self,
+        max_retries: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        deadline: Union[float, None] = None,
+    ):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.started = time.monotonic()
+
+    def should_retry_response(self, response: httpx.Response) -> bool:
+        """服务端通过 `x-should-retry` 明确表态时以其为准，否则看状态码"""
+        should_retry = response.headers.get("x-should-retry")
+        if should_retry == "true":
+            return True
+        if should_retry == "false":
+            return False
+        return response.status_code in RETRYABLE_STATUS_CODES
+
+    @staticmethod
+    def should_retry_error(error: Exception) -> bool:
+        return isinstance(error, RETRYABLE_ERRORS)
+
+    def next_delay(self, attempt: int, response: Union[httpx.Response, None] = None) -> Union[float, None]:
+        """返回第 `attempt` 次重试前应等待的秒数；预算或截止时间用完时返回 None"""
+        if attempt >= self.max_retries:
+            return None
+
+        delay = parse_retry_after(response.headers) if response is not None else None
+        if delay is None:
+            delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+        else:
+            # 按服务端给出的重置时间等待，加一点抖动避免多个客户端同时醒来
+            delay += random.uniform(0, min(self.base_delay, delay * 0.1 + 0.05))
+
+        if self.deadline is not None:
+            remaining = self.deadline - (time.monotonic() - self.started)
+            if delay >= remaining:
+                return None
+        return delay
@@ -0,0 +1,160 @@
+import io
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Tuple, Union
+
+from PIL import Image
+
+
+def difference_hash(image: Union[bytes, Image.Image], hash_size: int = 16) -> int:
+    """计算截图的差值哈希（dHash）：缩成 (hash_size+1)×hash_size 灰度图，比较相邻像素亮度，得到 hash_size² 位整数"""
+    if isinstance(image, (bytes, bytearray)):
+        image = Image.open(io.BytesIO(image))
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR, reducing_gap=2.0)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class OmniParserCache:
+    """OmniParser 解析结果缓存：以截图的 dHash + 解析参数为键，内存 LRU，可选 SQLite 持久层
+
+    内存中汉明距离不超过 `max_distance` 的截图视为同一画面（近似命中），磁盘层只做精确匹配。
+    缓存不保存标注图（`labeled_image`），命中时该字段为 None。
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 64,
+        max_distance: int = 2,
+        hash_size: int = 16,
+        ttl: Union[float, None] = None,
+        db_path: Union[str, None] = None,
+    ):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.hash_size = hash_size
+        self.ttl = ttl
+        self.db_path = db_path
+
+        self._entries = OrderedDict()  # (参数, 哈希) -> (过期时间, 解析结果)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        self.hits = 0
+        self.near_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if db_path:
+            self._connect().execute(
+                "CREATE TABLE IF NOT EXISTS omniparser_cache "
+                "(params TEXT NOT NULL, hash TEXT NOT NULL, value TEXT NOT NULL, expires REAL, PRIMARY KEY (params, hash))"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def params_key(**params) -> str:
+        """解析参数（box_threshold、iou_threshold、imgsz、use_paddleocr 等）的规范化表示"""
+        return json.dumps(params, sort_keys=True, separators=(",", ":"))
+
+    def lookup(self, image: Union[bytes, Image.Image], params: str) -> Tuple[Union[dict, None], int]:
+        """查找同一画面的解析结果，返回 (结果或 None, 截图哈希)；哈希可直接传给 `store`"""
+        image_hash = difference_hash(image, self.hash_size)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get((params, image_hash))
+            if entry is not None and (entry[0] is None or entry[0] > now):
+                self._entries.move_to_end((params, image_hash))
+                self.hits += 1
+                return self._hit(entry[1]), image_hash
+
+            best_key, best_distance = None, self.max_distance + 1
+            for key, (expires, _) in self._entries.items():
+                if key[0] != params or (expires is not None and expires <= now):
+                    continue
+                distance = hamming_distance(key[1], image_hash)
+                if distance < best_distance:
+                    best_key, best_distance = key, distance
+            if best_key is not None:
+                self._entries.move_to_end(best_key)
+                self.hits += 1
+                self.near_hits += 1
+                return self._hit(self._entries[best_key][1]), image_hash
+
+        if self.db_path:
+            row = self._connect().execute(
+                "SELECT value, expires FROM omniparser_cache WHERE params = ? AND hash = ?", (params, f"{image_hash:x}")
+            ).fetchone()
+            if row and (row[1] is None or row[1] > now):
+                value = json.loads(row[0])
+                with self._lock:
+                    self._store((params, image_hash), row[1], value)
+                    self.hits += 1
+                    self.disk_hits += 1
+                return self._hit(value), image_hash
+
+        with self._lock:
+            self.misses += 1
+        return None, image_hash
+
+    def store(self, image_hash: int, params: str, result: dict) -> None:
+        """保存一次成功的解析结果（不含标注图）"""
+        value = {
+            'status': 'success',
+            'parsed_content': result['parsed_content'],
+            'label_coordinates': result.get('label_coordinates'),
+        }
+        expires = time.time() + self.ttl if self.ttl else None
+        with self._lock:
+            self._store((params, image_hash), expires, value)
+        if self.db_path:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO omniparser_cache (params, hash, value, expires) VALUES (?, ?, ?, ?)",
+                (params, f"{image_hash:x}", json.dumps(value, ensure_ascii=False), expires),
+            )
+
+    def _store(self, key: tuple, expires: Union[float, None], value: dict) -> None:
+        self._entries[key] = (expires, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    @staticmethod
+    def _hit(value: dict) -> dict:
+        return dict(value, labeled_image=None, cached=True)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self.db_path:
+            self._connect().execute("DELETE FROM omniparser_cache")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": len(self._entries),
+        }
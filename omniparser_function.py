@@ -1,10 +1,12 @@
 import requests
-from PIL import Image
+from PIL import Image, ImageChops
 import base64
 import io
 import pyautogui
+import time
 from time import sleep
-import ast  # 用于解析字符串形式的字典
+from ui_elements import parse_elements, bboxes_to_coords, coords_to_normalized
+from config.config import UI_DEBUG
 
 
 # 定义统一变量
@@ -20,116 +22,361 @@ def update_target_icon(model_response):
         print("无效的 model_response，无法更新 TARGET_ICON")
 
 
-def process_image(
-        image_path: str,
-        api_url: str = "http://localhost:8000/process_image",
-        box_threshold: float = 0.05,
-        iou_threshold: float = 0.1,
-        use_paddleocr: bool = True,
-        imgsz: int = 640
-):
-    files = {
-        'file': ('image.png', open(image_path, 'rb'), 'image/png')
-    }
+def encode_image(image, image_format='PNG'):
+    """把截图编码为 PNG/WebP 字节串，PNG 用低压缩等级换取编码速度"""
+    buffer = io.BytesIO()
+    if image_format.upper() == 'WEBP':
+        image.save(buffer, format='WEBP', lossless=True, method=0)
+    else:
+        image.save(buffer, format='PNG', compress_level=1)
+    return buffer.getvalue()
+
+
+OMNIPARSER_API_URL = "http://localhost:8000/process_image"
 
-    params = {
+
+def _read_image(image_path, image_bytes):
+    if image_bytes is None:
+        with open(image_path, 'rb') as f:
+            image_bytes = f.read()
+    return image_bytes
+
+
+def _parse_params(box_threshold, iou_threshold, use_paddleocr, imgsz):
+    return {
         'box_threshold': box_threshold,
         'iou_threshold': iou_threshold,
         'use_paddleocr': use_paddleocr,
         'imgsz': imgsz
     }
 
-    response = requests.post(api_url, files=files, params=params)
-
-    if response.status_code == 200:
-        result = response.json()
-
-        if result['status'] == 'success':
-            labeled_image = Image.open(io.BytesIO(base64.b64decode(result['labeled_image'])))
-            return {
-                'status': 'success',
-                'labeled_image': labeled_image,
-                'parsed_content': result['parsed_content'],
-                'label_coordinates': result['label_coordinates']
-            }
-        else:
-            return {'status': 'error', 'message': result.get('message', 'Unknown error')}
-    else:
-        return {'status': 'error', 'message': f'HTTP error {response.status_code}'}
+
+def _build_result(status_code, result, want_labeled_image):
+    """把 OmniParser 的响应转换成统一的结果 dict；不需要标注图时跳过 base64 解码和 PIL 解析"""
+    if status_code != 200:
+        return {'status': 'error', 'message': f'HTTP error {status_code}'}
+    if result['status'] != 'success':
+        return {'status': 'error', 'message': result.get('message', 'Unknown error')}
+
+    labeled_image = None
+    if want_labeled_image:
+        labeled_image = Image.open(io.BytesIO(base64.b64decode(result['labeled_image'])))
+    return {
+        'status': 'success',
+        'labeled_image': labeled_image,
+        'parsed_content': result['parsed_content'],
+        'label_coordinates': result['label_coordinates']
+    }
+
+
+def _cache_lookup(cache, api_url, params, image_bytes):
+    """查询解析结果缓存，返回 (缓存结果或 None, 写回缓存用的 (哈希, 参数))"""
+    if cache is None:
+        return None, None
+    cache_params = cache.params_key(api_url=api_url, **params)
+    cached, image_hash = cache.lookup(image_bytes, cache_params)
+    if cached is not None:
+        print("OmniParser 缓存命中，跳过解析")
+    return cached, (image_hash, cache_params)
+
+
+class OmniParserClient:
+    """OmniParser 服务的客户端：复用连接池的 requests.Session，带连接/读取超时
+
+    `want_labeled_image=False` 时不解码标注图（只用 parsed_content 的场景可省下大块内存和解码时间），
+    传入 `cache`（`OmniParserCache`）且不需要标注图时，画面与参数都相同的截图直接返回缓存结果。
+    """
+
+    def __init__(
+            self,
+            api_url: str = OMNIPARSER_API_URL,
+            connect_timeout: float = 3.05,
+            read_timeout: float = 60,
+            pool_maxsize: int = 4,
+            want_labeled_image: bool = True,
+            cache=None
+    ):
+        self.api_url = api_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.want_labeled_image = want_labeled_image
+        self.cache = cache
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def process_image(
+            self,
+            image_path: str = None,
+            box_threshold: float = 0.05,
+            iou_threshold: float = 0.1,
+            use_paddleocr: bool = True,
+            imgsz: int = 640,
+            image_bytes: bytes = None,
+            image_format: str = 'png',
+            want_labeled_image: bool = None,
+            cache=None
+    ):
+        """把截图发给 OmniParser 解析；`image_bytes` 为内存中已编码的图像，传入时不再读文件"""
+        image_bytes = _read_image(image_path, image_bytes)
+        image_format = image_format.lower()
+        params = _parse_params(box_threshold, iou_threshold, use_paddleocr, imgsz)
+        if want_labeled_image is None:
+            want_labeled_image = self.want_labeled_image
+
+        cache = (cache if cache is not None else self.cache) if not want_labeled_image else None
+        cached, cache_key = _cache_lookup(cache, self.api_url, params, image_bytes)
+        if cached is not None:
+            return cached
+
+        files = {'file': (f'image.{image_format}', image_bytes, f'image/{image_format}')}
+        try:
+            response = self.session.post(self.api_url, files=files, params=params, timeout=self.timeout)
+        except requests.RequestException as e:
+            return {'status': 'error', 'message': f'Request failed: {e}'}
+
+        result = _build_result(response.status_code, response.json() if response.status_code == 200 else None, want_labeled_image)
+        if cache is not None and result['status'] == 'success':
+            cache.store(*cache_key, result)
+        return result
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class AsyncOmniParserClient:
+    """`OmniParserClient` 的异步版本，基于 httpx.AsyncClient 的连接池"""
+
+    def __init__(
+            self,
+            api_url: str = OMNIPARSER_API_URL,
+            connect_timeout: float = 3.05,
+            read_timeout: float = 60,
+            pool_maxsize: int = 4,
+            want_labeled_image: bool = True,
+            cache=None
+    ):
+        import httpx
+
+        self.api_url = api_url
+        self.want_labeled_image = want_labeled_image
+        self.cache = cache
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_maxsize, max_keepalive_connections=pool_maxsize),
+        )
+        self._request_error = httpx.HTTPError
+
+    async def process_image(
+            self,
+            image_path: str = None,
+            box_threshold: float = 0.05,
+            iou_threshold: float = 0.1,
+            use_paddleocr: bool = True,
+            imgsz: int = 640,
+            image_bytes: bytes = None,
+            image_format: str = 'png',
+            want_labeled_image: bool = None,
+            cache=None
+    ):
+        """异步解析截图，参数与 `OmniParserClient.process_image` 相同"""
+        image_bytes = _read_image(image_path, image_bytes)
+        image_format = image_format.lower()
+        params = _parse_params(box_threshold, iou_threshold, use_paddleocr, imgsz)
+        if want_labeled_image is None:
+            want_labeled_image = self.want_labeled_image
+
+        cache = (cache if cache is not None else self.cache) if not want_labeled_image else None
+        cached, cache_key = _cache_lookup(cache, self.api_url, params, image_bytes)
+        if cached is not None:
+            return cached
+
+        files = {'file': (f'image.{image_format}', image_bytes, f'image/{image_format}')}
+        try:
+            response = await self.client.post(self.api_url, files=files, params=params)
+        except self._request_error as e:
+            return {'status': 'error', 'message': f'Request failed: {e}'}
+
+        result = _build_result(response.status_code, response.json() if response.status_code == 200 else None, want_labeled_image)
+        if cache is not None and result['status'] == 'success':
+            cache.store(*cache_key, result)
+        return result
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+
+_default_clients = {}
+
+
+def process_image(
+        image_path: str = None,
+        api_url: str = OMNIPARSER_API_URL,
+        box_threshold: float = 0.05,
+        iou_threshold: float = 0.1,
+        use_paddleocr: bool = True,
+        imgsz: int = 640,
+        image_bytes: bytes = None,
+        image_format: str = 'png',
+        cache=None,
+        want_labeled_image: bool = True
+):
+    """把截图发给 OmniParser 解析（按 api_url 复用一个 `OmniParserClient` 的连接池）
+
+    传入 `cache`（`OmniParserCache`）且不需要标注图时，画面与参数都相同的截图直接返回缓存的解析结果。
+    """
+    client = _default_clients.get(api_url)
+    if client is None:
+        client = _default_clients.setdefault(api_url, OmniParserClient(api_url))
+    return client.process_image(
+        image_path, box_threshold, iou_threshold, use_paddleocr, imgsz,
+        image_bytes=image_bytes, image_format=image_format, want_labeled_image=want_labeled_image, cache=cache
+    )
 
 def parse_icon_data(content_str):
     """解析包含图标数据的字符串为列表."""
-    icons = []
-    lines = content_str.strip().split('\n')
-    for line in lines:
-        if line.startswith('icon '):
-            try:
-                # 提取花括号中的内容
-                dict_str = line[line.index('{'):line.rindex('}') + 1]
-                # 解析字符串为字典
-                icon_data = ast.literal_eval(dict_str)
-                icons.append(icon_data)
-            except Exception as e:
-                print(f"解析错误: {e}")
-                continue
-    return icons
-
-def bbox_to_coords(bbox, screen_width, screen_height):
-    """将 bbox 坐标转换为屏幕坐标."""
-    xmin, ymin, xmax, ymax = bbox
-
-    # 考虑 Mac 顶部菜单栏的偏移
-    menu_bar_height = 25
-
-    # 向上偏移以避免点击到文件名
-    y_offset = -15  # 向上偏移15像素
-
-    # 计算相对坐标
-    x_center = int((xmin + xmax) / 2 * screen_width)
-    y_center = int((ymin + ymax) / 2 * (screen_height - menu_bar_height)) + menu_bar_height + y_offset
-
-    # 添加调试信息
-    print(f"\n坐标转换详情:")
-    print(f"屏幕尺寸: {screen_width} x {screen_height}")
-    print(f"原始bbox: {bbox}")
-    print(f"x轴变换: {xmin:.4f} -> {xmax:.4f} 中点: {(xmin + xmax) / 2:.4f}")
-    print(f"y轴变换: {ymin:.4f} -> {ymax:.4f} 中点: {(ymin + ymax) / 2:.4f}")
-    print(f"考虑菜单栏偏移: {menu_bar_height}px")
-    print(f"向上偏移: {y_offset}px")
-    print(f"计算结果: x={x_center}, y={y_center}")
-
-    # 确保坐标在屏幕范围内
-    x_center = max(0, min(x_center, screen_width))
-    y_center = max(0, min(y_center, screen_height))
+    return parse_elements(content_str, prefix='icon ')
+
+def bbox_to_coords(bbox, screen_width, screen_height, menu_bar_height=25, y_offset=-15):
+    """将 bbox 坐标转换为屏幕坐标（menu_bar_height: Mac 顶部菜单栏高度；y_offset: 向上偏移以避免点击到文件名）."""
+    x_center, y_center = bboxes_to_coords([bbox], screen_width, screen_height, menu_bar_height, y_offset)[0].tolist()
+
+    if UI_DEBUG:
+        xmin, ymin, xmax, ymax = bbox
+        print(f"\n坐标转换详情:")
+        print(f"屏幕尺寸: {screen_width} x {screen_height}")
+        print(f"原始bbox: {bbox}")
+        print(f"x轴变换: {xmin:.4f} -> {xmax:.4f} 中点: {(xmin + xmax) / 2:.4f}")
+        print(f"y轴变换: {ymin:.4f} -> {ymax:.4f} 中点: {(ymin + ymax) / 2:.4f}")
+        print(f"考虑菜单栏偏移: {menu_bar_height}px")
+        print(f"向上偏移: {y_offset}px")
+        print(f"计算结果: x={x_center}, y={y_center}")
 
     return x_center, y_center
 
 
-def click_bbox(bbox):
-    """双击指定的 bbox."""
+# 执行配置：demo 保留原来便于观察的固定等待和鼠标动画；fast 瞬移鼠标，按画面变化决定等待多久
+EXECUTION_PROFILES = {
+    'demo': {'prepare_delay': 3, 'move_duration': 0.5, 'settle_delay': 1, 'wait_for_change': False},
+    'fast': {'prepare_delay': 0, 'move_duration': 0, 'settle_delay': 0, 'wait_for_change': True},
+}
+
+
+def grab_region(x, y, radius=120):
+    """截取以 (x, y) 为中心、边长 2*radius 的屏幕区域（裁剪到屏幕内）"""
+    screen_width, screen_height = pyautogui.size()
+    left, top = max(0, x - radius), max(0, y - radius)
+    width, height = min(screen_width, x + radius) - left, min(screen_height, y + radius) - top
+    return pyautogui.screenshot(region=(left, top, width, height))
+
+
+def frames_differ(a, b):
+    return a.size != b.size or ImageChops.difference(a.convert('RGB'), b.convert('RGB')).getbbox() is not None
+
+
+def wait_for_region_change(grab, baseline, timeout=3.0, interval=0.05):
+    """轮询 `grab()` 直到画面与 `baseline` 不同，超时返回 False"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if frames_differ(grab(), baseline):
+            return True
+        sleep(interval)
+    return False
+
+
+def wait_for_stable(grab, timeout=3.0, interval=0.1, stable_frames=2):
+    """轮询 `grab()` 直到连续 `stable_frames` 次画面不变（动画/加载结束），超时返回 False"""
+    deadline = time.monotonic() + timeout
+    previous, unchanged = grab(), 0
+    while time.monotonic() < deadline:
+        sleep(interval)
+        current = grab()
+        unchanged = 0 if frames_differ(current, previous) else unchanged + 1
+        if unchanged >= stable_frames:
+            return True
+        previous = current
+    return False
+
+
+# click_bbox 的返回状态
+CLICK_REFUSED = 'refused'      # 点击位置下是其他元素，没有点击
+CLICK_CHANGED = 'changed'      # 已点击，目标区域发生了变化
+CLICK_NO_CHANGE = 'no_change'  # 已点击，但等待时间内目标区域没有变化
+CLICK_DONE = 'clicked'         # 已点击，未检测画面变化（demo 配置）
+
+
+def click_bbox(bbox, profile='demo', timeout=3.0, action='double_click', spatial_index=None):
+    """双击（`action='click'` 时单击）指定的 bbox；`profile` 为 fast 时不做固定等待，改为等待目标区域变化并稳定
+
+    传入 `spatial_index`（`SpatialIndex`）时，点击前先检查点击位置下是否是目标元素（或包含、紧挨着目标的元素），
+    是其他元素则放弃点击；目标不在解析结果中无法核对时只打印提示，照常点击。
+    返回 `CLICK_REFUSED` / `CLICK_CHANGED` / `CLICK_NO_CHANGE` / `CLICK_DONE`。
+    """
+    settings = EXECUTION_PROFILES[profile]
+    action_name = '单击' if action == 'click' else '双击'
     # 获取屏幕分辨率
     screen_width, screen_height = pyautogui.size()
-    print(f"当前屏幕分辨率: {screen_width}x{screen_height}")
+    if UI_DEBUG:
+        print(f"当前屏幕分辨率: {screen_width}x{screen_height}")
 
     # 获取点击坐标
     x, y = bbox_to_coords(bbox, screen_width, screen_height)
 
-    print(f"\n即将执行双击:")
+    if spatial_index is not None:
+        ok, hits = spatial_index.verify_click(bbox, *coords_to_normalized(x, y, screen_width, screen_height))
+        labels = [spatial_index.table.labels[i] for i in hits]
+        if ok is None:
+            print(f"⚠️ 目标 bbox 不在解析结果中，无法核对点击位置 x={x}, y={y} 下的元素 {labels}，仍然点击")
+        elif not ok:
+            print(f"⚠️ 点击位置 x={x}, y={y} 下是其他元素 {labels}，放弃点击")
+            return CLICK_REFUSED
+
+    print(f"\n即将执行{action_name}:")
     print(f"目标坐标: x={x}, y={y}")
-    print("3秒准备时间...")
-    sleep(3)
+    if settings['prepare_delay']:
+        print(f"{settings['prepare_delay']}秒准备时间...")
+        sleep(settings['prepare_delay'])
 
     # 移动鼠标到指定位置
-    pyautogui.moveTo(x, y, duration=0.5)
+    pyautogui.moveTo(x, y, duration=settings['move_duration'], _pause=not settings['wait_for_change'])
 
-    print("鼠标已就位，1秒后双击...")
-    sleep(1)
+    if settings['settle_delay']:
+        print(f"鼠标已就位，{settings['settle_delay']}秒后{action_name}...")
+        sleep(settings['settle_delay'])
 
-    # 执行双击
-    pyautogui.doubleClick()
+    grab = lambda: grab_region(x, y)
+    baseline = None
+    if settings['wait_for_change']:
+        # 鼠标悬停的高亮/提示也会改变目标区域，等它稳定后再截基准画面，只把点击引起的变化算作变化
+        wait_for_stable(grab, timeout=0.5, interval=0.05, stable_frames=1)
+        baseline = grab()
+
+    # 执行点击
+    if action == 'click':
+        pyautogui.click(_pause=not settings['wait_for_change'])
+    else:
+        pyautogui.doubleClick(_pause=not settings['wait_for_change'])
 
-    print(f"已双击坐标: x={x}, y={y}")
+    print(f"已{action_name}坐标: x={x}, y={y}")
 
+    if baseline is not None:
+        changed = wait_for_region_change(grab, baseline, timeout)
+        stable = wait_for_stable(grab, timeout) if changed else False
+        print(f"目标区域{'已变化' if changed else '未变化'}{'，画面已稳定' if stable else ''}")
+        return CLICK_CHANGED if changed else CLICK_NO_CHANGE
+    return CLICK_DONE
 
 
 def find_target_coordinates(icons):
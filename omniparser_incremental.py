@@ -0,0 +1,154 @@
+from collections import deque
+from typing import Callable, List, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from omniparser_function import encode_image
+from ui_grounding import normalize_elements
+
+
+Region = Tuple[int, int, int, int]  # 像素坐标 (x0, y0, x1, y1)
+
+
+def changed_tiles(previous: Image.Image, current: Image.Image, tile: int = 32, threshold: float = 4.0) -> Union[np.ndarray, None]:
+    """把两帧切成 tile×tile 的块，返回平均灰度差超过 `threshold` 的块掩码；尺寸不同时返回 None"""
+    if previous.size != current.size:
+        return None
+    prev = np.asarray(previous.convert("L"), dtype=np.int16)
+    cur = np.asarray(current.convert("L"), dtype=np.int16)
+    height, width = cur.shape
+    rows, cols = -(-height // tile), -(-width // tile)
+    diff = np.pad(np.abs(cur - prev), ((0, rows * tile - height), (0, cols * tile - width)))
+    return diff.reshape(rows, tile, cols, tile).mean(axis=(1, 3)) > threshold
+
+
+def tile_regions(mask: np.ndarray, tile: int, size: Tuple[int, int]) -> List[Region]:
+    """把相连（8 邻域）的变化块合并成矩形区域，返回裁剪到画面内的像素坐标"""
+    width, height = size
+    rows, cols = mask.shape
+    seen = np.zeros_like(mask)
+    regions = []
+    for r, c in zip(*np.nonzero(mask)):
+        if seen[r, c]:
+            continue
+        seen[r, c] = True
+        queue = deque([(r, c)])
+        r0, c0, r1, c1 = r, c, r, c
+        while queue:
+            y, x = queue.popleft()
+            r0, c0, r1, c1 = min(r0, y), min(c0, x), max(r1, y), max(c1, x)
+            for ny in range(max(0, y - 1), min(rows, y + 2)):
+                for nx in range(max(0, x - 1), min(cols, x + 2)):
+                    if mask[ny, nx] and not seen[ny, nx]:
+                        seen[ny, nx] = True
+                        queue.append((ny, nx))
+        regions.append((int(c0 * tile), int(r0 * tile), min(width, int((c1 + 1) * tile)), min(height, int((r1 + 1) * tile))))
+    return regions
+
+
+def pad_region(region: Region, padding: int, size: Tuple[int, int]) -> Region:
+    x0, y0, x1, y1 = region
+    width, height = size
+    return max(0, x0 - padding), max(0, y0 - padding), min(width, x1 + padding), min(height, y1 + padding)
+
+
+def to_frame_bbox(bbox: list, crop: Region, size: Tuple[int, int]) -> List[float]:
+    """把裁剪图内的归一化 bbox 换算回整帧的归一化 bbox"""
+    x0, y0, x1, y1 = crop
+    width, height = size
+    crop_w, crop_h = x1 - x0, y1 - y0
+    return [
+        (x0 + bbox[0] * crop_w) / width,
+        (y0 + bbox[1] * crop_h) / height,
+        (x0 + bbox[2] * crop_w) / width,
+        (y0 + bbox[3] * crop_h) / height,
+    ]
+
+
+def _center_in(bbox: list, region: Region, size: Tuple[int, int]) -> bool:
+    width, height = size
+    x = (bbox[0] + bbox[2]) / 2 * width
+    y = (bbox[1] + bbox[3]) / 2 * height
+    return region[0] <= x < region[2] and region[1] <= y < region[3]
+
+
+class IncrementalParser:
+    """按块比较相邻两帧，只把变化的区域（带 `padding` 上下文）发给 OmniParser，再合并回上一帧的元素列表
+
+    变化区域占画面比例超过 `max_changed_ratio` 或分辨率变化时退回整帧解析；画面没有变化时直接返回上一帧的元素。
+    `parse_fn(image_bytes=...)` 负责实际调用 OmniParser（如绑定了解析参数的 `OmniParserClient.process_image`），
+    图像以关键字参数 `image_bytes` 传入，返回其结果 dict。
+    """
+
+    def __init__(
+        self,
+        parse_fn: Callable[..., dict],
+        tile: int = 32,
+        threshold: float = 4.0,
+        padding: int = 48,
+        max_changed_ratio: float = 0.5,
+    ):
+        self.parse_fn = parse_fn
+        self.tile = tile
+        self.threshold = threshold
+        self.padding = padding
+        self.max_changed_ratio = max_changed_ratio
+
+        self._frame = None
+        self._elements: List[dict] = []
+
+    def reset(self) -> None:
+        self._frame = None
+        self._elements = []
+
+    def parse(self, frame: Image.Image) -> dict:
+        """解析一帧截图，返回与 `process_image` 相同格式的结果，另带 `mode`：full / incremental / unchanged"""
+        size = frame.size
+        mask = changed_tiles(self._frame, frame, self.tile, self.threshold) if self._frame is not None else None
+        if mask is None:
+            return self._parse_full(frame)
+        if not mask.any():
+            return self._result(self._elements, "unchanged")
+
+        regions = tile_regions(mask, self.tile, size)
+        crops = [pad_region(region, self.padding, size) for region in regions]
+        changed_area = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in crops)
+        if changed_area > self.max_changed_ratio * size[0] * size[1]:
+            return self._parse_full(frame)
+
+        # 变化区域内的旧元素全部作废，由新解析的结果替换；落在 padding 里的新元素只作上下文，丢弃
+        elements = [el for el in self._elements if not any(_center_in(el["bbox"], region, size) for region in regions)]
+        for region, crop in zip(regions, crops):
+            result = self.parse_fn(image_bytes=encode_image(frame.crop(crop)))
+            if result.get("status") != "success":
+                return self._parse_full(frame)
+            for element in normalize_elements(result["parsed_content"]):
+                if not element.get("bbox"):
+                    continue
+                element = dict(element, bbox=to_frame_bbox(element["bbox"], crop, size))
+                if _center_in(element["bbox"], region, size):
+                    elements.append(element)
+
+        print(f"增量解析: {len(regions)} 个变化区域，占画面 {changed_area / (size[0] * size[1]):.1%}")
+        self._frame = frame
+        self._elements = elements
+        return self._result(elements, "incremental")
+
+    def _parse_full(self, frame: Image.Image) -> dict:
+        result = self.parse_fn(image_bytes=encode_image(frame))
+        if result.get("status") == "success":
+            self._frame = frame
+            self._elements = normalize_elements(result["parsed_content"])
+            result = dict(result, parsed_content=self._elements)
+        return dict(result, mode="full")
+
+    @staticmethod
+    def _result(elements: List[dict], mode: str) -> dict:
+        return {
+            "status": "success",
+            "labeled_image": None,
+            "parsed_content": list(elements),
+            "label_coordinates": None,
+            "mode": mode,
+        }
@@ -1,19 +1,27 @@
-def get_operation_prompt(user_input, parsed_content):
+from ui_grounding import shortlist_elements, render_elements_table
+
+
+def get_operation_prompt(user_input, parsed_content, top_k=15):
     """
     生成用于操作意图推理的 prompt。
 
     Args:
         user_input (str): 用户输入的指令，例如“帮我打开浏览器”。
         parsed_content (list): 界面解析数据，包含 label 和 bbox 的列表。
+        top_k (int): 先在本地按标签检索，只把最相关的 top_k 个候选元素放进 prompt。
 
     Returns:
         str: 完整的 prompt 字符串。
     """
+    candidates = shortlist_elements(user_input, parsed_content, top_k)
+    elements_table = render_elements_table(candidates)
+
     prompt = f"""
     你是一个智能助手，负责理解用户的操作意图并根据界面结构化数据找到符合目标的元素。请按照以下步骤进行推理，并将你的思考过程详细记录下来，最后以 JSON 格式返回结果。
 
     用户输入："{user_input}"
-    界面解析数据：{parsed_content}
+    界面候选元素（已按与用户输入的相关度预筛选）：
+{elements_table}
 
     ### 推理步骤：
     1. **提取操作和目标**：
@@ -28,7 +36,7 @@ def get_operation_prompt(user_input, parsed_content):
          - 其他动词根据语义判断。
 
     3. **在界面数据中匹配目标**：
-       - 界面解析数据是一个列表，每个元素包含“label”和“bbox”字段。
+       - 候选元素表每行一个元素，格式为 id|type|label|bbox。
          - “label”是元素描述，“bbox”是归一化坐标 [左上角x, 左上角y, 右下角x, 右下角y]。
        - 目标可能有多种表达，例如“浏览器”可能是“Google Chrome”或“Microsoft Edge”。
        - 通过语义匹配找到最符合目标的元素。
@@ -51,6 +59,60 @@ def get_operation_prompt(user_input, parsed_content):
     return prompt
 
 
+def get_plan_prompt(user_input, parsed_content, top_k=30):
+    """
+    生成多步操作计划的 prompt：一次推理把复合指令拆成有序的动作列表。
+
+    Args:
+        user_input (str): 用户输入的指令，例如“打开浏览器然后点击地址栏”。
+        parsed_content (list): 当前界面的解析数据。
+        top_k (int): 放进 prompt 的候选元素个数，多步指令涉及多个目标，默认比单步更多。
+
+    Returns:
+        str: 完整的 prompt 字符串。
+    """
+    candidates = shortlist_elements(user_input, parsed_content, top_k)
+    elements_table = render_elements_table(candidates)
+
+    prompt = f"""
+    你是一个智能助手，负责把用户的界面操作指令拆解成按顺序执行的动作列表，并根据当前界面数据定位每一步的目标元素。
+
+    用户输入："{user_input}"
+    当前界面候选元素（已按与用户输入的相关度预筛选）：
+{elements_table}
+
+    ### 推理步骤：
+    1. **拆分步骤**：按“然后”“再”“接着”等连接词和语义把指令拆成若干步，保持原有顺序。
+    2. **确定动作类型**，只能是以下之一：
+       - “click”：单击，“点击”“选择”等。
+       - “double_click”：双击，“打开”“启动”等。
+       - “type”：输入文字，填写 “text” 字段。
+       - “hotkey”：组合键，“keys” 字段为按键列表，例如 ["ctrl", "l"]。
+       - “wait_for_change”：等待界面变化（如窗口打开、页面加载），可选 “timeout” 秒数。
+    3. **定位目标**（仅 click / double_click）：
+       - 候选元素表每行一个元素，格式为 id|type|label|bbox，bbox 为归一化坐标 [左上角x, 左上角y, 右下角x, 右下角y]。
+       - 目标在当前界面中可见时，填写其 “target” 和 “bbox”。
+       - 目标要在前面的步骤执行后才会出现时（例如打开浏览器后的地址栏），“bbox” 填 null，并设置 “refresh”: true，执行时会重新解析屏幕再定位。
+    4. 打开应用、切换窗口等会改变界面的步骤之后，加一步 “wait_for_change”。
+
+    ### 输出要求：
+    - 先简要说明拆分和定位的思考过程。
+    - 然后以 JSON 格式返回结果，格式如下：
+      ```json
+      {{
+        "steps": [
+          {{"action": "double_click", "target": "目标名称", "bbox": [左上角x, 左上角y, 右下角x, 右下角y]}},
+          {{"action": "wait_for_change", "timeout": 10}},
+          {{"action": "click", "target": "目标名称", "bbox": null, "refresh": true}},
+          {{"action": "type", "text": "要输入的文字"}},
+          {{"action": "hotkey", "keys": ["enter"]}}
+        ]
+      }}
+    """
+
+    return prompt
+
+
 def get_agent_prompt():
     prompt = f"""
             You are an AI assistant capable of calling external tools to complete user requests.
@@ -61,4 +123,31 @@ def get_agent_prompt():
             3. **Never assume the current time based on your training data—always use the time returned by `get_current_time()`.**  
             4. **If a task requires a date reference (e.g., searching news, scheduling events), call `get_current_time()` first and use its result.**
             """
-    return prompt
\ No newline at end of file
+    return prompt
+
+def get_summary_prompt(summary, transcript):
+    """
+    生成对话摘要的 prompt：把移出上下文窗口的旧对话并入已有摘要。
+
+    Args:
+        summary (str): 之前的摘要，没有时为空字符串。
+        transcript (str): 被移出窗口的旧对话文本。
+
+    Returns:
+        str: 完整的 prompt 字符串。
+    """
+    prompt = f"""
+            Update the running summary of a conversation between a user and an AI assistant.
+
+            ### Current summary:
+            {summary or "(empty)"}
+
+            ### Older messages to fold in:
+            {transcript}
+
+            ### Rules:
+            1. Keep facts the assistant may need later: user preferences, names, email addresses, decisions, results of tool calls.
+            2. Drop greetings, repetition and raw tool output details.
+            3. Write in the language the user uses, at most 200 words, plain text only.
+            """
+    return prompt
@@ -0,0 +1,66 @@
+from functools import partial
+
+import pytest
+from PIL import Image, ImageDraw
+
+pytest.importorskip("pyautogui")
+
+from omniparser_function import OmniParserClient
+from omniparser_incremental import IncrementalParser
+
+
+class _StubResponse:
+    status_code = 200
+
+    def __init__(self, payload):
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+
+class _StubSession:
+    """记录上传的图像，返回固定的 OmniParser 响应"""
+
+    def __init__(self):
+        self.uploads = []
+
+    def post(self, url, files=None, params=None, timeout=None):
+        name, image_bytes, content_type = files["file"]
+        self.uploads.append(image_bytes)
+        return _StubResponse({
+            "status": "success",
+            "labeled_image": "",
+            "parsed_content": [{"type": "icon", "bbox": [0.4, 0.4, 0.6, 0.6], "interactivity": True, "content": "Button"}],
+            "label_coordinates": {},
+        })
+
+    def close(self):
+        pass
+
+
+def _frame(box=None):
+    frame = Image.new("RGB", (320, 240), "white")
+    if box:
+        ImageDraw.Draw(frame).rectangle(box, fill="black")
+    return frame
+
+
+def test_incremental_parser_sends_image_bytes_to_process_image():
+    client = OmniParserClient(want_labeled_image=False)
+    client.session = _StubSession()
+    parser = IncrementalParser(partial(client.process_image, box_threshold=0.05, iou_threshold=0.1, use_paddleocr=True, imgsz=640))
+
+    result = parser.parse(_frame())
+    assert result["status"] == "success"
+    assert result["mode"] == "full"
+    assert client.session.uploads[0].startswith(b"\x89PNG")
+
+    assert parser.parse(_frame())["mode"] == "unchanged"
+    assert len(client.session.uploads) == 1
+
+    result = parser.parse(_frame((10, 10, 40, 40)))
+    assert result["status"] == "success"
+    assert result["mode"] == "incremental"
+    assert len(client.session.uploads) == 2
+    assert all(upload.startswith(b"\x89PNG") for upload in client.session.uploads)
@@ -0,0 +1,68 @@
+import asyncio
+import inspect
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Tuple
+
+
+# 同一轮中的工具调用默认并发执行的线程数
+MAX_TOOL_WORKERS = 4
+
+_executor = ThreadPoolExecutor(max_workers=MAX_TOOL_WORKERS, thread_name_prefix="tool")
+
+
+def serial_tool(func: Callable) -> Callable:
+    """标记必须串行执行的工具（如操作鼠标键盘的 `execute_ui`）：同一轮中按顺序逐个执行，不与其他串行工具并发"""
+    func.serial = True
+    return func
+
+
+def is_serial(func: Callable) -> bool:
+    return getattr(func, "serial", False)
+
+
+def parse_arguments(raw_arguments) -> dict:
+    """工具参数可能是 JSON 字符串或 dict，统一转成 dict（无参数时为空 dict）"""
+    if isinstance(raw_arguments, str):
+        return json.loads(raw_arguments) if raw_arguments.strip() else {}
+    if isinstance(raw_arguments, dict):
+        return raw_arguments
+    return {}
+
+
+def call_tool(func: Callable, arguments: dict):
+    """执行一个工具，异步工具在当前线程的事件循环中运行；异常转成文本结果交给模型处理"""
+    try:
+        if inspect.iscoroutinefunction(func):
+            return asyncio.run(func(**arguments))
+        return func(**arguments)
+    except Exception as e:
+        print(f"❌ 工具 {getattr(func, '__name__', func)} 执行失败: {e}")
+        return f"工具执行失败: {e}"
+
+
+def run_tool_calls(calls: List[Tuple[str, Callable, dict]]) -> List[object]:
+    """执行一轮中的全部工具调用 (调用 id 或名称, func, arguments)，按传入顺序返回结果
+
+    普通工具提交到线程池并发执行，串行工具在当前线程按顺序执行（与并发工具同时进行），
+    总耗时约为 max(各工具耗时) 而不是它们的和。
+    """
+    started = time.perf_counter()
+    futures = {
+        i: _executor.submit(call_tool, func, arguments)
+        for i, (name, func, arguments) in enumerate(calls) if not is_serial(func)
+    }
+    outputs = [None] * len(calls)
+    for i, (name, func, arguments) in enumerate(calls):
+        if i not in futures:
+            outputs[i] = call_tool(func, arguments)
+    for i, future in futures.items():
+        outputs[i] = future.result()
+    if len(calls) > 1:
+        print(f"⏱️ {len(calls)} 个工具调用（{len(futures)} 个并发）耗时 {time.perf_counter() - started:.2f}s")
+    return outputs
+
+
+def format_tool_output(output) -> str:
+    return json.dumps(output, ensure_ascii=False) if isinstance(output, (dict, list)) else str(output)
@@ -95,6 +95,25 @@ tools = [
         },
 
 
+    },
+    {
+        'type': 'function',
+        'function': {
+            'name': 'execute_ui_plan',
+            'description': 'Executes a compound UI automation command with several steps (e.g. open the browser, then click the address bar and type a URL) from a single screen analysis.',
+            'parameters': {
+                'type': 'object',
+                'properties': {
+                    'user_input': {
+                        'type': 'string',
+                        'description': "The user's multi-step operation instruction, such as 'Open the browser, then click the address bar'."
+                    },
+                },
+                'required': ['user_input'],
+            },
+
+        },
+
     },
 ]
 
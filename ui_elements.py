@@ -0,0 +1,169 @@
+import ast
+import re
+from typing import List, Union
+
+import numpy as np
+
+
+# `icon N: {'type': 'text', 'bbox': [...], 'interactivity': False, 'content': '...'}` 中的一个键值对
+_FIELD = re.compile(
+    r"""['"](\w+)['"]\s*:\s*('[^'\\]*(?:\\.[^'\\]*)*'|"[^"\\]*(?:\\.[^"\\]*)*"|\[[^\]]*\]|True|False|None|-?[\d.eE+-]+)"""
+)
+
+
+# OmniParser 默认输出格式的整行正则，一次 findall 解析整段文本
+_CANONICAL_LINE = re.compile(
+    r"""\{'type': '([^'\n]*)', 'bbox': \[([^\]\n]*)\], 'interactivity': (True|False), """
+    r"""'content': ('[^'\\\n]*(?:\\.[^'\\\n]*)*'|"[^"\\\n]*(?:\\.[^"\\\n]*)*")\}[ \t\r]*$""",
+    re.M,
+)
+
+
+def _unquote(token: str) -> str:
+    return token[1:-1] if "\\" not in token else ast.literal_eval(token)
+
+
+def _parse_value(token: str):
+    first = token[0]
+    if first in "'\"":
+        return _unquote(token)
+    if first == "[":
+        return [float(v) for v in token[1:-1].split(",") if v.strip()]
+    if token == "True":
+        return True
+    if token == "False":
+        return False
+    if token == "None":
+        return None
+    return float(token)
+
+
+def parse_element_line(line: str) -> Union[dict, None]:
+    """解析一行 OmniParser 输出为元素 dict：先用正则逐个提取键值，格式不符时退回 ast.literal_eval"""
+    start = line.find("{")
+    if start < 0:
+        return None
+    element = {key: _parse_value(token) for key, token in _FIELD.findall(line, start)}
+    if "bbox" in element and len(element["bbox"]) == 4:
+        return element
+    try:
+        return ast.literal_eval(line[start:line.rindex("}") + 1])
+    except (ValueError, SyntaxError):
+        return None
+
+
+def _canonical_matches(content: str, prefix: Union[str, None]):
+    """挑出含元素的行；全部符合默认格式时一并返回整段正则的匹配结果，否则匹配结果为 None"""
+    if not prefix:
+        # 每个元素恰好一个 `{`，匹配数与之相同说明整段都是默认格式，无需先逐行切分
+        matches = _CANONICAL_LINE.findall(content)
+        if len(matches) == content.count("{"):
+            return None, matches
+    lines = [line for line in content.strip().split("\n") if "{" in line and (not prefix or line.startswith(prefix))]
+    matches = _CANONICAL_LINE.findall("\n".join(lines))
+    return lines, (matches if len(matches) == len(lines) else None)
+
+
+def parse_columns(content: str, prefix: Union[str, None] = None):
+    """把 OmniParser 的文本输出解析成列 (bboxes (N, 4), labels, types, interactivity)
+
+    每行都是默认格式时用一次整段正则 + 一次数组转换完成；否则退回逐行解析。
+    """
+    lines, matches = _canonical_matches(content, prefix)
+    if matches is not None:
+        if not matches:
+            return np.empty((0, 4)), [], [], np.empty(0, dtype=bool)
+        types, bbox_tokens, flags, contents = zip(*matches)
+        bboxes = np.array(",".join(bbox_tokens).split(","), dtype=np.float64).reshape(-1, 4)
+        labels = [_unquote(token).strip() for token in contents]
+        interactivity = np.array([flag == "True" for flag in flags], dtype=bool)
+        return bboxes, labels, list(types), interactivity
+
+    elements = [el for el in (parse_element_line(line) for line in lines) if el is not None and el.get("bbox")]
+    return _columns_from_elements(elements)
+
+
+def _columns_from_elements(elements: List[dict]):
+    bboxes = np.array([el["bbox"] for el in elements], dtype=np.float64).reshape(-1, 4)
+    labels = [str(el.get("content") or el.get("label") or "").strip() for el in elements]
+    types = [el.get("type", "") for el in elements]
+    interactivity = np.array([bool(el.get("interactivity")) for el in elements], dtype=bool)
+    return bboxes, labels, types, interactivity
+
+
+def parse_elements(content: str, prefix: Union[str, None] = None) -> List[dict]:
+    """把 OmniParser 的文本输出逐行解析成元素 dict 列表；`prefix` 用于只保留以其开头的行（如 'icon '）"""
+    lines, matches = _canonical_matches(content, prefix)
+    if matches is not None:
+        return [
+            {
+                "type": type_,
+                "bbox": [float(v) for v in bbox.split(",")],
+                "interactivity": flag == "True",
+                "content": _unquote(content),
+            }
+            for type_, bbox, flag, content in matches
+        ]
+    return [el for el in (parse_element_line(line) for line in lines) if el is not None]
+
+
+def bboxes_to_coords(
+    bboxes: np.ndarray,
+    screen_width: int,
+    screen_height: int,
+    menu_bar_height: int = 25,
+    y_offset: int = -15,
+) -> np.ndarray:
+    """批量把归一化 bbox 转换为屏幕点击坐标 (N, 2)：取中心点，考虑顶部菜单栏和向上偏移，并裁剪到屏幕内"""
+    bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+    x = ((bboxes[:, 0] + bboxes[:, 2]) / 2 * screen_width).astype(np.int64)
+    y = ((bboxes[:, 1] + bboxes[:, 3]) / 2 * (screen_height - menu_bar_height)).astype(np.int64) + menu_bar_height + y_offset
+    return np.stack([np.clip(x, 0, screen_width), np.clip(y, 0, screen_height)], axis=1)
+
+
+def coords_to_normalized(x: int, y: int, screen_width: int, screen_height: int, menu_bar_height: int = 25):
+    """`bboxes_to_coords` 的逆变换：屏幕坐标 -> 归一化坐标（用于检查点击位置下的元素）"""
+    return x / screen_width, (y - menu_bar_height) / (screen_height - menu_bar_height)
+
+
+class ElementTable:
+    """列式存储的界面元素表：bbox 为 (N, 4) 数组，标签、类型、可交互性为平行数组"""
+
+    __slots__ = ("bboxes", "labels", "types", "interactivity")
+
+    def __init__(self, bboxes: np.ndarray, labels: List[str], types: List[str], interactivity: np.ndarray):
+        self.bboxes = bboxes
+        self.labels = labels
+        self.types = types
+        self.interactivity = interactivity
+
+    @classmethod
+    def from_parsed(cls, parsed_content: Union[list, str]) -> "ElementTable":
+        """从 OmniParser 的 parsed_content（元素列表或 `icon N: {...}` 文本）构造"""
+        if isinstance(parsed_content, str):
+            return cls(*parse_columns(parsed_content))
+        return cls(*_columns_from_elements(
+            [el for el in parsed_content or [] if isinstance(el, dict) and el.get("bbox")]
+        ))
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def element(self, index: int) -> dict:
+        return {
+            "type": self.types[index],
+            "bbox": self.bboxes[index].tolist(),
+            "interactivity": bool(self.interactivity[index]),
+            "content": self.labels[index],
+        }
+
+    def to_elements(self) -> List[dict]:
+        return [self.element(i) for i in range(len(self))]
+
+    def centers(self) -> np.ndarray:
+        """各元素中心点的归一化坐标 (N, 2)"""
+        return (self.bboxes[:, :2] + self.bboxes[:, 2:]) / 2
+
+    def screen_coords(self, screen_width: int, screen_height: int, **kwargs) -> np.ndarray:
+        """全部元素的屏幕点击坐标 (N, 2)，参数同 `bboxes_to_coords`"""
+        return bboxes_to_coords(self.bboxes, screen_width, screen_height, **kwargs)
@@ -0,0 +1,330 @@
+import math
+import re
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+from typing import Dict, List, Tuple, Union
+
+from ui_elements import ElementTable, parse_elements
+from ui_spatial import SpatialIndex
+
+
+# 中文目标词 -> 界面上可能出现的英文/别名标签
+SYNONYMS = {
+    "浏览器": ["chrome", "google chrome", "edge", "microsoft edge", "firefox", "browser", "谷歌浏览器"],
+    "谷歌": ["google", "chrome"],
+    "回收站": ["recycle bin", "trash", "废纸篓"],
+    "文件夹": ["folder", "file explorer", "资源管理器"],
+    "下载": ["downloads", "download"],
+    "资源管理器": ["file explorer", "explorer"],
+    "终端": ["terminal", "powershell", "cmd", "命令提示符"],
+    "设置": ["settings", "preferences"],
+    "邮件": ["mail", "outlook", "gmail", "邮箱"],
+    "记事本": ["notepad"],
+    "微信": ["wechat", "weixin"],
+    "音乐": ["music", "spotify", "网易云音乐"],
+    "搜索": ["search", "查找"],
+    "地址栏": ["address bar", "address", "url", "search or type"],
+    "关闭": ["close", "×"],
+    "最小化": ["minimize"],
+    "最大化": ["maximize"],
+    "保存": ["save"],
+    "确定": ["ok", "confirm"],
+    "取消": ["cancel"],
+    "计算器": ["calculator"],
+    "开始": ["start", "windows"],
+}
+
+# 指令中与目标无关的词，检索前去掉（“的”常出现在目标名称中，如“我的电脑”，不在此列）
+STOPWORDS = ["帮我", "请", "一下", "打开", "启动", "点击", "单击", "双击", "选择", "运行", "进入", "那个", "这个"]
+
+_LATIN_WORD = re.compile(r"[a-z0-9]+")
+_CJK_RUN = re.compile(r"[\u4e00-\u9fff]+")
+
+
+def element_label(element: dict) -> str:
+    """OmniParser 元素的文字描述，兼容 `content` 和 `label` 两种字段"""
+    return str(element.get("content") or element.get("label") or "").strip()
+
+
+def normalize_elements(parsed_content: Union[list, str]) -> List[dict]:
+    """把 OmniParser 的 parsed_content（元素列表或 `icon N: {...}` 文本）统一成元素 dict 列表"""
+    if isinstance(parsed_content, str):
+        return parse_elements(parsed_content)
+    return [element for element in parsed_content or [] if isinstance(element, dict)]
+
+
+def tokenize(text: str) -> List[str]:
+    """检索用的分词：英文按单词 + 字符三元组（容错拼写/截断），中文按单字 + 二元组"""
+    text = text.lower()
+    tokens = []
+    for word in _LATIN_WORD.findall(text):
+        tokens.append(word)
+        padded = f"#{word}#"
+        tokens.extend(f"~{padded[i:i + 3]}" for i in range(len(padded) - 2))
+    for run in _CJK_RUN.findall(text):
+        tokens.extend(run)
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def expand_query(instruction: str) -> str:
+    """去掉动作词，并按同义词表补充目标的别名"""
+    query = instruction
+    for word in STOPWORDS:
+        query = query.replace(word, " ")
+    extra = [alias for key, aliases in SYNONYMS.items() if key in query for alias in aliases]
+    return " ".join([query] + extra)
+
+
+class ElementIndex:
+    """界面元素标签上的 BM25 倒排索引，用于在调用 LLM 前预筛选候选元素"""
+
+    def __init__(self, parsed_content: Union[list, str], k1: float = 1.2, b: float = 0.75):
+        self.elements = normalize_elements(parsed_content)
+        self.k1 = k1
+        self.b = b
+
+        self._postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self._lengths = []
+        for index, element in enumerate(self.elements):
+            counts = Counter(tokenize(element_label(element)))
+            self._lengths.append(sum(counts.values()))
+            for token, tf in counts.items():
+                self._postings[token].append((index, tf))
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+
+    def scores(self, instruction: str) -> List[float]:
+        """每个元素与指令的 BM25 相关度"""
+        scores = [0.0] * len(self.elements)
+        n = len(self.elements)
+        for token in set(tokenize(expand_query(instruction))):
+            postings = self._postings.get(token)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for index, tf in postings:
+                norm = 1 - self.b + self.b * self._lengths[index] / (self._avg_length or 1)
+                scores[index] += idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+        return scores
+
+    def search(self, instruction: str, top_k: int = 15) -> List[Tuple[int, float]]:
+        """返回相关度最高的 top_k 个 (元素序号, 分数)，只包含分数大于 0 的元素"""
+        scores = self.scores(instruction)
+        ranked = sorted((i for i, score in enumerate(scores) if score > 0), key=lambda i: -scores[i])
+        return [(i, scores[i]) for i in ranked[:top_k]]
+
+
+def shortlist_elements(
+    instruction: str,
+    parsed_content: Union[list, str],
+    top_k: int = 15,
+    weak_ratio: float = 0.25,
+) -> List[Tuple[int, dict]]:
+    """为指令挑选 top_k 个候选元素 (原始序号, 元素)
+
+    分数不低于最高分 `weak_ratio` 倍的命中排在前面；命中太少或只有零星的弱命中（如偶然相同的字符三元组）时，
+    用其余元素补足 top_k 个（可交互的优先），避免真正的目标因为没有字面匹配而被挤出 prompt。
+    """
+    index = ElementIndex(parsed_content)
+    scores = index.scores(instruction)
+    best = max(scores, default=0.0)
+    strong = sorted((i for i, score in enumerate(scores) if score > 0 and score >= weak_ratio * best), key=lambda i: -scores[i])
+    chosen = set(strong[:top_k])
+    rest = sorted(
+        (i for i in range(len(index.elements)) if i not in chosen),
+        key=lambda i: (not index.elements[i].get("interactivity", True), -scores[i], i),
+    )
+    return [(i, index.elements[i]) for i in (strong[:top_k] + rest)[:top_k]]
+
+
+def render_elements_table(candidates: List[Tuple[int, dict]]) -> str:
+    """把候选元素渲染成紧凑的表格：id|type|label|bbox，bbox 保留 3 位小数"""
+    lines = ["id|type|label|bbox"]
+    for index, element in candidates:
+        bbox = ",".join(f"{v:.3f}" for v in element.get("bbox", []))
+        label = element_label(element).replace("|", "/").replace("\n", " ")
+        lines.append(f"{index}|{element.get('type', '')}|{label}|[{bbox}]")
+    return "\n".join(lines)
+
+
+# 动作动词 -> 动作类型，长词优先匹配
+ACTION_VERBS = [
+    ("双击", "double_click"), ("打开", "double_click"), ("启动", "double_click"), ("运行", "double_click"),
+    ("double click", "double_click"), ("open", "double_click"), ("launch", "double_click"),
+    ("点击", "click"), ("单击", "click"), ("选择", "click"), ("click", "click"), ("select", "click"),
+]
+
+# 目标名词后常见的修饰词，匹配标签前去掉
+TARGET_SUFFIXES = ["图标", "按钮", "应用", "程序", "软件", "icon", "button", "app"]
+
+_NON_WORD = re.compile(r"[^0-9a-z\u4e00-\u9fff]+")
+
+
+def normalize_label(text: str) -> str:
+    """小写并去掉空格和标点，用于标签比较"""
+    return _NON_WORD.sub("", text.lower())
+
+
+def _split_action(instruction: str) -> Tuple[Union[str, None], str]:
+    """识别动作动词，返回 (动作类型, 去掉动作词和停用词后的文本)"""
+    text = instruction.strip()
+    lowered = text.lower()
+    action = None
+    for verb, verb_action in ACTION_VERBS:
+        position = lowered.find(verb)
+        if position >= 0:
+            action = verb_action
+            text = text[:position] + " " + text[position + len(verb):]
+            lowered = text.lower()
+            break
+
+    for word in STOPWORDS:
+        text = text.replace(word, " ")
+    return action, text.strip()
+
+
+def parse_instruction(instruction: str) -> Tuple[Union[str, None], str]:
+    """从指令中解析 (动作类型, 目标)，例如“点击回收站图标” -> ("click", "回收站")"""
+    action, target = _split_action(instruction)
+    for suffix in TARGET_SUFFIXES:
+        if target.lower().endswith(suffix) and len(target) > len(suffix):
+            target = target[:-len(suffix)].strip()
+    return action, target
+
+
+def label_similarity(target: str, label: str) -> float:
+    """目标与元素标签的相似度 [0, 1]：完全相同为 1，包含关系按长度比例打分，否则用编辑相似度"""
+    t, l = normalize_label(target), normalize_label(label)
+    if not t or not l:
+        return 0.0
+    if t == l:
+        return 1.0
+    if t in l:
+        return 0.75 + 0.25 * len(t) / len(l)
+    if l in t:
+        return 0.6 + 0.25 * len(l) / len(t)
+    return SequenceMatcher(None, t, l).ratio() * 0.8
+
+
+def target_similarity(target: str, label: str) -> float:
+    """考虑同义词后的相似度，取目标本身和各别名中的最大值"""
+    candidates = [target] + [alias for key, aliases in SYNONYMS.items() if key in target for alias in aliases]
+    return max(label_similarity(candidate, label) for candidate in candidates)
+
+
+def match_target(
+    instruction: str,
+    parsed_content: Union[list, str],
+    threshold: float = 0.85,
+    margin: float = 0.1,
+) -> Union[dict, None]:
+    """本地确定性匹配：最高分超过 `threshold` 且领先第二名 `margin` 以上时直接返回目标，否则返回 None 交给 LLM
+
+    返回格式与 LLM 推理结果一致：{"target", "action", "bbox", "score"}。
+    指令带空间关系（如“回收站下面的图标”）时改由 `resolve_spatial` 按锚点和方位定位。
+    """
+    if parse_spatial_reference(instruction) is not None:
+        return resolve_spatial(instruction, parsed_content, threshold=threshold, margin=margin)
+
+    action, target = parse_instruction(instruction)
+    if not target:
+        return None
+
+    scored = []
+    for element in normalize_elements(parsed_content):
+        label = element_label(element)
+        if label and element.get("bbox"):
+            scored.append((target_similarity(target, label), element))
+    if not scored:
+        return None
+
+    scored.sort(key=lambda item: -item[0])
+    best_score, best = scored[0]
+    runner_up = scored[1][0] if len(scored) > 1 else 0.0
+    if best_score < threshold or best_score - runner_up < margin:
+        return None
+
+    return {
+        "target": element_label(best),
+        "action": action or "double_click",
+        "bbox": best["bbox"],
+        "score": round(best_score, 4),
+    }
+
+
+# 空间关系词 -> 方向；中文为“锚点 + 方位词 + 的 + 目标”，英文为“目标 + 方位 + 锚点”
+SPATIAL_WORDS_ZH = {
+    "右边": "right", "右侧": "right", "右面": "right",
+    "左边": "left", "左侧": "left", "左面": "left",
+    "下面": "below", "下方": "below", "下边": "below",
+    "上面": "above", "上方": "above", "上边": "above",
+}
+SPATIAL_WORDS_EN = {
+    "to the right of": "right", "right of": "right",
+    "to the left of": "left", "left of": "left",
+    "under": "below", "below": "below", "beneath": "below",
+    "above": "above",
+}
+_SPATIAL_ZH = re.compile(r"(.+?)(" + "|".join(SPATIAL_WORDS_ZH) + r")的?(.*)")
+_SPATIAL_EN = re.compile(r"(.*?)\b(" + "|".join(SPATIAL_WORDS_EN) + r")\b(.+)", re.I)
+
+# 目标描述中的类型词 -> OmniParser 元素类型
+TYPE_WORDS = {"图标": "icon", "按钮": "icon", "icon": "icon", "button": "icon", "文字": "text", "文本": "text", "text": "text"}
+
+
+def parse_spatial_reference(instruction: str) -> Union[Tuple[Union[str, None], str, str, str], None]:
+    """解析带空间关系的指令，返回 (动作类型, 锚点, 方向, 目标描述)，例如
+    “点击回收站下面的图标” -> ("click", "回收站", "below", "图标")；没有空间关系时返回 None"""
+    action, text = _split_action(instruction)
+    match = _SPATIAL_ZH.search(text)
+    if match:
+        anchor, word, target = match.groups()
+        return action, anchor.strip(), SPATIAL_WORDS_ZH[word], target.strip()
+    match = _SPATIAL_EN.search(text)
+    if match:
+        target, word, anchor = match.groups()
+        anchor = re.sub(r"^\s*the\s+", "", anchor, flags=re.I)
+        return action, anchor.strip(), SPATIAL_WORDS_EN[word.lower()], re.sub(r"^\s*the\s+", "", target, flags=re.I).strip()
+    return None
+
+
+def resolve_spatial(
+    instruction: str,
+    parsed_content: Union[list, str],
+    index: Union[SpatialIndex, None] = None,
+    threshold: float = 0.85,
+    margin: float = 0.1,
+) -> Union[dict, None]:
+    """在本地解析“X 右边的按钮”“the icon under Recycle Bin”这类空间关系：
+    锚点按标签匹配（同样要求 `threshold`/`margin`），目标取锚点在该方向上最近的元素（可按类型词过滤）"""
+    reference = parse_spatial_reference(instruction)
+    if reference is None:
+        return None
+    action, anchor, direction, target = reference
+
+    index = index or SpatialIndex(ElementTable.from_parsed(parsed_content))
+    labels = index.table.labels
+    scores = sorted(((target_similarity(anchor, label), i) for i, label in enumerate(labels) if label), reverse=True)
+    if not scores or scores[0][0] < threshold or (len(scores) > 1 and scores[0][0] - scores[1][0] < margin):
+        return None
+    anchor_index = scores[0][1]
+
+    wanted_type = next((t for word, t in TYPE_WORDS.items() if word in target.lower()), None)
+    for candidate in index.neighbor(anchor_index, direction, k=5):
+        if wanted_type and index.table.types[candidate] != wanted_type:
+            continue
+        label = labels[candidate]
+        # 目标描述里除类型词外还有名称时，要求名称也能对上
+        name = target
+        for word in TYPE_WORDS:
+            name = name.replace(word, "")
+        if name.strip() and target_similarity(name.strip(), label) < threshold:
+            continue
+        return {
+            "target": label,
+            "action": action or "click",
+            "bbox": index.bboxes[candidate].tolist(),
+            "score": round(scores[0][0], 4),
+            "anchor": labels[anchor_index],
+        }
+    return None
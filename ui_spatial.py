@@ -0,0 +1,187 @@
+import math
+from typing import List, Tuple, Union
+
+import numpy as np
+
+from ui_elements import ElementTable
+
+
+# 方向 -> 单位向量（归一化坐标，y 轴向下）
+DIRECTIONS = {
+    "right": (1.0, 0.0),
+    "left": (-1.0, 0.0),
+    "below": (0.0, 1.0),
+    "above": (0.0, -1.0),
+}
+
+
+class SpatialIndex:
+    """界面元素 bbox 上的均匀网格索引，支持点命中、最近邻、方向邻居和包含查询
+
+    坐标均为归一化坐标 [0, 1]。每个元素登记在它覆盖的所有网格中，
+    查询只检查相关网格里的元素，几千个元素时单次查询也只涉及少量候选。
+    """
+
+    def __init__(self, table: ElementTable, grid_size: Union[int, None] = None):
+        self.table = table
+        n = len(table)
+        # 平均每格 2 个元素左右
+        self.grid_size = grid_size or max(1, min(64, int(math.sqrt(n / 2)) or 1))
+        self.bboxes = table.bboxes
+        self.centers = table.centers() if n else np.empty((0, 2))
+        self.areas = (self.bboxes[:, 2] - self.bboxes[:, 0]) * (self.bboxes[:, 3] - self.bboxes[:, 1]) if n else np.empty(0)
+
+        g = self.grid_size
+        cells = [[] for _ in range(g * g)]
+        if n:
+            lo = np.clip((self.bboxes[:, :2] * g).astype(np.int64), 0, g - 1)
+            hi = np.clip((self.bboxes[:, 2:] * g).astype(np.int64), 0, g - 1)
+            for index, (x0, y0, x1, y1) in enumerate(np.hstack([lo, hi]).tolist()):
+                for row in range(y0, y1 + 1):
+                    for col in range(x0, x1 + 1):
+                        cells[row * g + col].append(index)
+        self._cells = [np.array(cell, dtype=np.int64) for cell in cells]
+
+    @classmethod
+    def from_parsed(cls, parsed_content: Union[list, str], **kwargs) -> "SpatialIndex":
+        return cls(ElementTable.from_parsed(parsed_content), **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def _cell(self, x: float, y: float) -> Tuple[int, int]:
+        g = self.grid_size
+        return min(g - 1, max(0, int(x * g))), min(g - 1, max(0, int(y * g)))
+
+    def _ring(self, col: int, row: int, radius: int) -> np.ndarray:
+        """与 (col, row) 切比雪夫距离恰为 radius 的网格中的元素"""
+        g = self.grid_size
+        found = []
+        for r in range(row - radius, row + radius + 1):
+            if not 0 <= r < g:
+                continue
+            edge = r in (row - radius, row + radius)
+            for c in (range(col - radius, col + radius + 1) if edge else (col - radius, col + radius)):
+                if 0 <= c < g and self._cells[r * g + c].size:
+                    found.append(self._cells[r * g + c])
+        return np.unique(np.concatenate(found)) if found else np.empty(0, dtype=np.int64)
+
+    def find(self, bbox: list, atol: float = 1e-3) -> int:
+        """按 bbox 找到元素序号，找不到返回 -1
+
+        LLM 拿到的候选表中 bbox 只保留 3 位小数，因此按 `atol` 容差匹配，取偏差最小的元素。
+        """
+        if not len(self):
+            return -1
+        error = np.abs(self.bboxes - np.asarray(bbox, dtype=np.float64)).max(axis=1)
+        best = int(np.argmin(error))
+        return best if error[best] <= atol else -1
+
+    def hit_test(self, x: float, y: float) -> List[int]:
+        """包含点 (x, y) 的元素，面积小（更具体）的在前"""
+        if not len(self):
+            return []
+        col, row = self._cell(x, y)
+        candidates = self._cells[row * self.grid_size + col]
+        if not candidates.size:
+            return []
+        boxes = self.bboxes[candidates]
+        inside = (boxes[:, 0] <= x) & (x <= boxes[:, 2]) & (boxes[:, 1] <= y) & (y <= boxes[:, 3])
+        hits = candidates[inside]
+        return hits[np.argsort(self.areas[hits], kind="stable")].tolist()
+
+    def nearest(self, x: float, y: float, k: int = 1, exclude: Union[int, None] = None) -> List[int]:
+        """中心点离 (x, y) 最近的 k 个元素，从所在网格向外逐圈扩展"""
+        if not len(self):
+            return []
+        col, row = self._cell(x, y)
+        cell_size = 1.0 / self.grid_size
+        candidates = np.empty(0, dtype=np.int64)
+        for radius in range(self.grid_size):
+            candidates = np.union1d(candidates, self._ring(col, row, radius))
+            if exclude is not None:
+                candidates = candidates[candidates != exclude]
+            if candidates.size >= k:
+                distances = np.hypot(*(self.centers[candidates] - (x, y)).T)
+                order = np.argsort(distances, kind="stable")[:k]
+                # 圈外的元素距离至少为 radius 个网格，第 k 近的元素比它更近才能确定结果
+                if distances[order[-1]] <= radius * cell_size:
+                    return candidates[order].tolist()
+        distances = np.hypot(*(self.centers[candidates] - (x, y)).T)
+        return candidates[np.argsort(distances, kind="stable")[:k]].tolist()
+
+    def neighbor(self, index: int, direction: str, k: int = 1, max_angle: float = 45.0) -> List[int]:
+        """元素 `index` 在 `direction`（right/left/above/below）方向上的邻居：
+        中心点落在以该方向为轴、半角 `max_angle` 的扇形内，按“沿轴距离 + 2×偏轴距离”排序"""
+        if not 0 <= index < len(self):
+            return []
+        dx, dy = DIRECTIONS[direction]
+        origin = self.centers[index]
+        slope = math.tan(math.radians(max_angle))
+        col, row = self._cell(*origin)
+        cell_size = 1.0 / self.grid_size
+
+        seen = np.empty(0, dtype=np.int64)
+        best, best_score = np.empty(0, dtype=np.int64), np.empty(0)
+        for radius in range(self.grid_size):
+            ring = np.setdiff1d(self._ring(col, row, radius), seen, assume_unique=True)
+            seen = np.union1d(seen, ring)
+            if ring.size:
+                offsets = self.centers[ring] - origin
+                along = offsets[:, 0] * dx + offsets[:, 1] * dy
+                across = np.abs(offsets[:, 0] * dy - offsets[:, 1] * dx)
+                keep = (along > 0) & (across <= along * slope) & (ring != index)
+                best = np.concatenate([best, ring[keep]])
+                best_score = np.concatenate([best_score, along[keep] + 2 * across[keep]])
+            # 圈外元素的得分不小于它到起点的距离，也就不小于 radius 个网格
+            if best.size >= k and np.sort(best_score)[k - 1] <= radius * cell_size:
+                break
+        return best[np.argsort(best_score, kind="stable")[:k]].tolist()
+
+    def contained_in(self, bbox: list) -> List[int]:
+        """完全位于 `bbox` 内的元素（如对话框、工具栏中的按钮）"""
+        if not len(self):
+            return []
+        x0, y0, x1, y1 = bbox
+        (c0, r0), (c1, r1) = self._cell(x0, y0), self._cell(x1, y1)
+        g = self.grid_size
+        cells = [self._cells[r * g + c] for r in range(r0, r1 + 1) for c in range(c0, c1 + 1) if self._cells[r * g + c].size]
+        if not cells:
+            return []
+        candidates = np.unique(np.concatenate(cells))
+        boxes = self.bboxes[candidates]
+        inside = (boxes[:, 0] >= x0) & (boxes[:, 1] >= y0) & (boxes[:, 2] <= x1) & (boxes[:, 3] <= y1)
+        return candidates[inside].tolist()
+
+    def containers(self, index: int) -> List[int]:
+        """完全包含元素 `index` 的其他元素，面积小的在前"""
+        if not 0 <= index < len(self):
+            return []
+        x, y = self.centers[index]
+        bbox = self.bboxes[index]
+        return [
+            i for i in self.hit_test(x, y)
+            if i != index and np.all(self.bboxes[i, :2] <= bbox[:2]) and np.all(self.bboxes[i, 2:] >= bbox[2:])
+        ]
+
+    def touches(self, index: int, bbox: list, tolerance: float = 0.01) -> bool:
+        """元素 `index` 与 `bbox` 重叠或相邻（间隙不超过 `tolerance`）"""
+        x0, y0, x1, y1 = self.bboxes[index]
+        return bool(x0 <= bbox[2] + tolerance and bbox[0] <= x1 + tolerance
+                and y0 <= bbox[3] + tolerance and bbox[1] <= y1 + tolerance)
+
+    def verify_click(self, bbox: list, x: float, y: float) -> Tuple[Union[bool, None], List[int]]:
+        """点击前检查 (x, y) 下面的元素，返回 (结果, 命中的元素)
+
+        落在空白处，或最具体的命中元素是目标本身、包含目标的元素、与目标重叠或相邻的元素
+        （`bbox_to_coords` 的 y_offset 会把文字标签的点击点上移到其上方的图标）时通过；
+        `bbox` 不在解析结果中、无法核对时结果为 None。
+        """
+        hits = self.hit_test(x, y)
+        if not hits:
+            return True, hits
+        target = self.find(bbox)
+        if target < 0:
+            return None, hits
+        top = hits[0]
+        return top == target or top in self.containers(target) or self.touches(top, self.bboxes[target]), hits